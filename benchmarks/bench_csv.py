@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+Benchmark CsvReconciler against a local stand-in for the reconciliation
+service (periodo_reconciler.server), on synthetic CSV files built from a
+PeriodO dataset.
+
+For each combination of row count, page size, HTTP method and
+query_by_query mode, reports rows/sec, p50/p99 request latency and peak
+RSS. Each run happens in a fresh process so that neither the lru_cache
+nor the peak RSS carries over between runs.
+
+    python benchmarks/bench_csv.py --rows 1000 --rows 100000 \\
+        --page_size 100 --page_size 1000 --latency 0.002
+"""
+
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from periodo_reconciler import (  # noqa: E402
+    PeriodoReconciler,
+    LocalPeriodoReconciler,
+    CsvReconciler
+)
+from periodo_reconciler.server import serve_in_thread  # noqa: E402
+
+# values that show up in real exports and match nothing
+JUNK_QUERIES = ['', 'Not determined', 'other', 'lb', 'Unknown period']
+
+
+def write_synthetic_csv(path, periods, rows, distinct, seed=0):
+    """
+    write a CSV of rows rows drawing on distinct distinct query tuples
+    """
+    rng = random.Random(seed)
+    tuples = []
+    for i in range(distinct):
+        if rng.random() < 0.1:
+            tuples.append((rng.choice(JUNK_QUERIES), 'Cyprus', '', ''))
+            continue
+        period = rng.choice(periods)
+        tuples.append((period.label.strip(), 'Cyprus',
+                       (period.start or 0) + rng.randint(-50, 50),
+                       (period.stop or 0) + rng.randint(-50, 50)))
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'note', 'period', 'place', 'start', 'stop'])
+        for i in range(rows):
+            (query, place, start, stop) = rng.choice(tuples)
+            writer.writerow([i, 'row {}'.format(i), query, place,
+                             start, stop])
+
+
+def percentile(values, p):
+    if not len(values):
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def run_one(config):
+    """
+    reconcile one CSV with one configuration; runs in a child process
+    """
+    latencies = []
+    p_recon = PeriodoReconciler(host=config['host'],
+                                workers=config['workers'])
+    p_recon.session.hooks['response'].append(
+        lambda r, *args, **kwargs: latencies.append(
+            r.elapsed.total_seconds()))
+
+    t0 = time.perf_counter()
+    error = None
+    try:
+        with open(config['csv_path'], newline='', encoding='utf-8') as f:
+            c_recon = CsvReconciler(f, p_recon, 'period', 'place',
+                                    'start', 'stop',
+                                    page_size=config['page_size'],
+                                    query_by_query=config['query_by_query'],
+                                    dedup=config['dedup'],
+                                    method=config['method'])
+            with open(os.devnull, 'w', newline='') as out:
+                c_recon.to_csv(out, c_recon.matches())
+    except Exception as e:
+        # e.g., a 414 for a GET with a whole page of queries in the URL
+        error = '{}: {}'.format(type(e).__name__, str(e)[:100])
+    elapsed = time.perf_counter() - t0
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        maxrss //= 1024
+
+    return dict(config,
+                error=error,
+                seconds=round(elapsed, 3),
+                rows_per_sec=round(config['rows'] / elapsed, 1),
+                requests=len(latencies),
+                p50_ms=round(1000 * (percentile(latencies, 50) or 0), 2),
+                p99_ms=round(1000 * (percentile(latencies, 99) or 0), 2),
+                peak_rss_mb=round(maxrss / 1024, 1))
+
+
+@click.command()
+@click.option('--dataset', default='data/p0dg76f.jsonld',
+              type=click.Path(exists=True, dir_okay=False),
+              help='PeriodO JSON-LD file to serve and draw labels from')
+@click.option('--rows', multiple=True, type=int,
+              default=[1000, 10000],
+              help='rows in the synthetic CSV (repeatable)')
+@click.option('--distinct', default=500, type=int,
+              help='distinct query tuples in the synthetic CSV')
+@click.option('--page_size', multiple=True, type=int,
+              default=[100, 1000],
+              help='CsvReconciler page size (repeatable)')
+@click.option('--method', multiple=True, default=['post', 'get'],
+              type=click.Choice(['get', 'post']),
+              help='HTTP method (repeatable)')
+@click.option('--query_by_query', multiple=True, type=bool,
+              default=[True, False],
+              help='query_by_query mode (repeatable)')
+@click.option('--dedup/--no-dedup', default=True,
+              help='deduplicate query tuples in CsvReconciler')
+@click.option('--workers', default=1, type=int,
+              help='PeriodoReconciler workers')
+@click.option('--latency', default=0.0, type=float,
+              help='seconds the server waits before each response')
+@click.option('--error_rate', default=0.0, type=float,
+              help='fraction of requests the server fails with a 503')
+@click.option('--output', default=None, type=click.File('w'),
+              help='write the results as JSON lines to this file')
+def bench(dataset, rows, distinct, page_size, method, query_by_query,
+          dedup, workers, latency, error_rate, output):
+    """
+    Benchmark CsvReconciler against a local mock reconciler.
+    """
+    engine = LocalPeriodoReconciler.from_file(dataset)
+    server = serve_in_thread(engine, latency=latency,
+                             error_rate=error_rate, seed=0)
+    host = 'localhost:{}'.format(server.server_port)
+
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in rows:
+            csv_path = os.path.join(tmp, 'synthetic-{}.csv'.format(n))
+            write_synthetic_csv(csv_path, engine.periods, n, distinct)
+
+            for (size, m, qbq) in itertools.product(page_size, method,
+                                                    query_by_query):
+                config = {'host': host, 'csv_path': csv_path, 'rows': n,
+                          'page_size': size, 'method': m,
+                          'query_by_query': qbq, 'dedup': dedup,
+                          'workers': workers}
+                with ctx.Pool(1) as pool:
+                    result = pool.apply(run_one, (config,))
+                del result['host']
+                del result['csv_path']
+
+                label = ('rows={rows} page_size={page_size} '
+                         'method={method} query_by_query={query_by_query}: '
+                         .format(**result))
+                if result['error'] is not None:
+                    click.echo(label + 'failed: ' + result['error'])
+                else:
+                    click.echo(label +
+                               '{rows_per_sec} rows/s, {requests} requests, '
+                               'p50 {p50_ms} ms, p99 {p99_ms} ms, '
+                               'peak RSS {peak_rss_mb} MB'.format(**result))
+                if output is not None:
+                    output.write(json.dumps(result) + '\n')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    bench()
@@ -1,17 +1,63 @@
 import csv
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import io
+import itertools
 import json
-import uuid
-from collections import OrderedDict, defaultdict, Counter
+import sys
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict, Counter, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 import urllib.parse
-from functools import lru_cache
 
-# for LRU cache
+from .batching import AdaptiveBatcher
+from .cache import (SqliteCache, MemoryCache, CachedError,
+                    is_permanent_error, has_candidates)
+from .checkpoint import CheckpointJournal
+from .dataset import Period, read_periods, periods_from_dataset
+from .instrument import Instrumentation, NullInstrumentation
+from .index import (LabelIndex, IntervalIndex, SpatialIndex,
+                    normalize_label)
+from .local import LocalPeriodoReconciler
+from .prefilter import QueryFilter, fold_query
+from .preview import PreviewStore
+from .suggest import SuggestCache
+
+# for the in-process cache of responses (MemoryCache)
 CACHE_MAX_SIZE = 65536
 
+# HTTP status codes worth retrying
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+# the methods to retry (the queries are all reads), under the name urllib3
+# gives the option: allowed_methods from 1.26, method_whitelist before
+if hasattr(Retry, 'DEFAULT_ALLOWED_METHODS'):
+    _RETRY_METHODS = {'allowed_methods': frozenset(['GET', 'POST'])}
+else:
+    _RETRY_METHODS = {'method_whitelist': frozenset(['GET', 'POST'])}
+
+# source of the labels of RQuery objects made without one
+_labels = itertools.count()
+
+# what CsvReconciler keeps of a reconciler response: the counts and the
+# accepted candidate (match_id and match_name are '' if there is none)
+MatchResult = namedtuple('MatchResult', ['candidates_count', 'match_num',
+                                         'match_id', 'match_name'])
+
+# the MatchResult of a row that is never sent (see QueryFilter)
+EMPTY_MATCH = MatchResult(0, 0, '', '')
+
 __all__ = ['RProperty', 'RQuery', 'PeriodoReconciler',
-           'CsvReconciler', 'non_none_values', 'grouper', 'CACHE_MAX_SIZE']
+           'CsvReconciler', 'non_none_values', 'grouper', 'CACHE_MAX_SIZE',
+           'SqliteCache', 'make_session', 'AdaptiveBatcher',
+           'Period', 'read_periods', 'periods_from_dataset',
+           'LocalPeriodoReconciler', 'LabelIndex', 'IntervalIndex',
+           'SpatialIndex', 'normalize_label', 'Instrumentation',
+           'CheckpointJournal', 'MatchResult', 'QueryKey', 'MemoryCache',
+           'CachedError', 'QueryFilter', 'fold_query', 'match_result',
+           'transpose_terms', 'SuggestCache', 'PreviewStore']
 
 # a wrapper for
 # https://github.com/periodo/periodo-reconciler/blob/master/API.md
@@ -52,9 +98,86 @@ def non_none_values(dict_):
     ])
 
 
+def transpose_terms(q):
+    """
+    'Roman, Late' -> 'Late Roman': transpose only if there is a single ","
+    """
+    terms = [term.strip() for term in q.split(",")]
+    if (len(terms) == 2):
+        return terms[1] + " " + terms[0]
+    else:
+        return q
+
+
+def match_result(response, match_top_candidate=True):
+    """
+    the MatchResult for a reconciler response: the accepted candidate is
+    the one flagged as a match or, with match_top_candidate, the top one
+    """
+    results = response['result']
+    match_num = sum(1 for result in results if result['match'])
+
+    # I think that number of matches must be 0 or 1
+    # otherwise: a bug in the reconciler
+    assert match_num < 2
+
+    if (match_num == 1) or (match_top_candidate and len(results)):
+        return MatchResult(len(results), match_num,
+                           results[0]['id'], results[0]['name'])
+    else:
+        return MatchResult(len(results), match_num, '', '')
+
+
+def make_session(pool_size=10, max_retries=3, backoff_factor=0.5,
+                 adapter=None, read_retries=None):
+    """
+    return a requests.Session that keeps connections alive and retries
+    connection errors and 5xx responses with exponential backoff
+
+
+    Parameters
+    ----------
+    pool_size : int
+        number of connections to keep open per host
+    max_retries : int
+        number of times to retry a request
+    backoff_factor : float
+        retries sleep for backoff_factor * 2 ** (retry number - 1) seconds
+    adapter : requests.adapters.HTTPAdapter, optional
+        adapter to mount instead of the default one
+    read_retries : int, optional
+        number of times to retry a request whose response timed out,
+        if fewer than max_retries
+
+    Returns
+    -------
+    requests.Session
+
+    """
+    if adapter is None:
+        retry = Retry(total=max_retries,
+                      read=read_retries,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=RETRY_STATUS_CODES,
+                      raise_on_status=False,
+                      **_RETRY_METHODS)
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size,
+                              max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
 class RProperty(object):
+
+    __slots__ = ('p', 'v')
+
     def __init__(self, p, v):
-        self.p = p
+        # there are only a few property names, shared by all the queries
+        self.p = sys.intern(p)
         self.v = v
 
     def to_dict(self):
@@ -65,15 +188,80 @@ class RProperty(object):
                 .format(json.dumps(self.p), json.dumps(self.v)))
 
 
+class QueryKey(object):
+    """
+    the canonical, hashable form of a query, leaving out its label; the
+    hash is computed once and the JSON only when first asked for
+
+    Two queries with the same query, limit and property (name, value)
+    pairs have equal keys, and the same json: that of {'_': query dict}
+    with sorted keys, which is also the key of the SqliteCache.
+    """
+
+    __slots__ = ('query', 'limit', 'properties', '_hash', '_json')
+
+    def __init__(self, query, limit=None, properties=()):
+        self.query = query
+        self.limit = limit
+        self.properties = tuple(properties)
+        self._hash = hash((query, limit, self.properties))
+        self._json = None
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, QueryKey):
+            return NotImplemented
+        return (self._hash == other._hash and
+                self.query == other.query and
+                self.limit == other.limit and
+                self.properties == other.properties)
+
+    def __repr__(self):
+        return """QueryKey({})""".format(self.json)
+
+    def to_dict(self):
+        v = {'query': self.query}
+        if self.limit is not None:
+            v['limit'] = self.limit
+        if len(self.properties):
+            v['properties'] = [{'p': p, 'v': v_}
+                               for (p, v_) in self.properties]
+        return v
+
+    @property
+    def json(self):
+        if self._json is None:
+            self._json = json.dumps({'_': self.to_dict()}, sort_keys=True)
+        return self._json
+
+
 class RQuery(object):
+
+    __slots__ = ('query', 'label', 'limit', 'properties', '_key')
+
     def __init__(self, query, label=None, limit=None, properties=None):
         self.query = query
         if label is None:
-            self.label = str(uuid.uuid4())
+            # unique within the process, which is all a label needs
+            self.label = 'q{}'.format(next(_labels))
         else:
             self.label = label
         self.limit = limit
         self.properties = properties
+        self._key = None
+
+    @property
+    def key(self):
+        """
+        the QueryKey of this query, computed on first use
+        """
+        if self._key is None:
+            self._key = QueryKey(
+                self.query, self.limit,
+                [(p.p, p.v) for p in (self.properties or [])])
+        return self._key
 
     def to_key_value(self):
         v = {'query': self.query}
@@ -106,47 +294,226 @@ class RQuery(object):
 
 
 class PeriodoReconciler(object):
-    def __init__(self, host='localhost:8142', protocol='http'):
+    def __init__(self, host='localhost:8142', protocol='http', cache=None,
+                 workers=1, session=None, adapter=None, timeout=None,
+                 pool_size=None, max_retries=3, backoff_factor=0.5,
+                 batcher=None, instrumentation=None, memory=None,
+                 negative_ttl=3600.0, error_ttl=60.0, suggest_cache=None,
+                 preview_store=None):
         self.host = host
         self.protocol = protocol
         self.base_url = '{}://{}/'.format(protocol, host)
 
+        # a pooled keep-alive session shared by all requests; pass in
+        # session or adapter to configure the HTTP layer yourself
+        if session is None:
+            if pool_size is None:
+                pool_size = max(10, workers)
+            # a batch that timed out is split by the batcher rather than
+            # sent again whole
+            session = make_session(pool_size=pool_size,
+                                   max_retries=max_retries,
+                                   backoff_factor=backoff_factor,
+                                   adapter=adapter,
+                                   read_retries=(None if batcher is None
+                                                 else 0))
+        elif adapter is not None:
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        # (connect, read) timeout in seconds for each request
+        self.timeout = timeout
+        # optional AdaptiveBatcher to split multi-query requests
+        self.batcher = batcher
+        # in-process cache of the responses to _call_reconciler, by
+        # QueryKey
+        if memory is None:
+            memory = MemoryCache(max_entries=CACHE_MAX_SIZE)
+        self.memory = memory
+        # optional persistent cache (e.g., SqliteCache) that sits behind
+        # self.memory
+        self.cache = cache
+        # seconds to cache responses without candidates for (None: as
+        # long as any other response), and permanent (4xx) failures for
+        # (None: not at all); 5xx failures are never cached
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        # optional SuggestCache of suggest_entities results
+        self.suggest_cache = suggest_cache
+        # optional PreviewStore of preview_period bodies
+        self.preview_store = preview_store
+        # maximum number of queries in flight in query_by_query mode
+        self.workers = workers
+        # timers and counters (see Instrumentation)
+        if instrumentation is None:
+            instrumentation = NullInstrumentation()
+        self.instrumentation = instrumentation
+
+        # calls to _call_reconciler in progress, so that concurrent
+        # identical queries are only sent once
+        self._in_flight = dict()
+        self._in_flight_lock = threading.Lock()
+        # the pool of self.workers threads for query_by_query mode and
+        # preview_periods, made on first use and shut down by close
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
     def __repr__(self):
         return ("""PeriodoReconciler(host={}, protocol={})"""
                 .format(json.dumps(self.host),
                         json.dumps(self.protocol)))
 
-    def describe(self):
-        r = requests.get(self.base_url)
-        return r.json()
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            return self._executor
 
-    @lru_cache(maxsize=CACHE_MAX_SIZE)
-    def _call_reconciler(self, query_dict_json, method='GET'):
+    def close(self):
+        """
+        shut down the pool of worker threads; it is made again if the
+        reconciler is used after
+        """
+        with self._executor_lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown()
+
+    def _request(self, method, url, **kwargs):
+        with self.instrumentation.timer('http'):
+            r = self.session.request(method, url, timeout=self.timeout,
+                                     **kwargs)
+
+        self.instrumentation.count('requests_sent')
+        self.instrumentation.count(
+            'bytes_sent', len(r.request.url) + len(r.request.body or ''))
+        self.instrumentation.count('bytes_received', len(r.content))
+        retries = getattr(r.raw, 'retries', None)
+        if retries is not None and len(retries.history):
+            self.instrumentation.count('retries', len(retries.history))
+        return r
+
+    def _query_reconciler(self, queries_json, method='GET'):
         if method.upper() == 'GET':
-            r = requests.get(self.base_url, params={
-                             'queries': query_dict_json})
+            r = self._request('GET', self.base_url,
+                              params={'queries': queries_json})
         elif method.upper() == 'POST':
-            r = requests.post(self.base_url, data={
-                              'queries': query_dict_json})
+            r = self._request('POST', self.base_url,
+                              data={'queries': queries_json})
 
         if r.status_code == 200:
             return r.json()
         else:
             r.raise_for_status()
 
+    def describe(self):
+        r = self._request('GET', self.base_url)
+        return r.json()
+
+    def _ttl_for(self, result):
+        """
+        the expiry for caching result: negative_ttl if it has no
+        candidates, else None for the caches' default
+        """
+        if not has_candidates(result):
+            return self.negative_ttl
+        return None
+
+    def _call_reconciler(self, query_key, method='GET'):
+        result = self.memory.get(query_key)
+        if isinstance(result, CachedError):
+            self.instrumentation.count('errors_cached')
+            response = requests.Response()
+            response.status_code = result.status
+            response.url = result.url
+            raise requests.HTTPError(result.message, response=response)
+        if result is not None:
+            return result
+        self.instrumentation.count('lru_misses')
+
+        # the JSON of the query is only needed from here on
+        with self.instrumentation.timer('serialize'):
+            query_dict_json = query_key.json
+
+        if self.cache is not None:
+            result = self.cache.get(query_dict_json)
+            if result is not None:
+                self.instrumentation.count('cache_hits')
+                self.memory.set(query_key, result, self._ttl_for(result))
+                return result
+            self.instrumentation.count('cache_misses')
+
+        try:
+            result = self._query_reconciler(query_dict_json, method)
+        except requests.HTTPError as e:
+            status = getattr(e.response, 'status_code', None)
+            if (self.error_ttl is not None and status is not None and
+                    is_permanent_error(status)):
+                self.memory.set(
+                    query_key,
+                    CachedError(status, str(e), e.response.url,
+                                getattr(e.request, 'method', None)),
+                    self.error_ttl)
+            raise
+
+        if result is not None:
+            ttl = self._ttl_for(result)
+            self.memory.set(query_key, result, ttl)
+            if self.cache is not None:
+                self.cache.set(query_dict_json, result, ttl)
+        return result
+
+    def _call_reconciler_coalesced(self, query_key, method='GET'):
+        """
+        _call_reconciler, except that a call for a query that another
+        thread is already sending waits for that response
+        """
+        with self._in_flight_lock:
+            future = self._in_flight.get(query_key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[query_key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._call_reconciler(query_key, method)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[query_key]
+
     def _reconcile_query_by_query(self, queries, method='GET'):
 
-        queries_dict = OrderedDict([q.to_key_value() for q in queries])
-        results_dict = dict()
+        # the label is not part of the key, so that it doesn't mess up
+        # the caching
+        query_keys = [q.key for q in queries]
+        self.instrumentation.count('lru_lookups', len(query_keys))
+
+        if self.workers > 1 and len(query_keys) > 1:
+            results = list(self._get_executor().map(
+                lambda query_key: self._call_reconciler_coalesced(
+                    query_key, method),
+                query_keys))
+        else:
+            results = [self._call_reconciler(query_key, method)
+                       for query_key in query_keys]
 
-        for (k, v) in queries_dict.items():
-            # don't let the label for the query mess up the caching
-            query_dict = {'_': v}
-            query_dict_json = json.dumps(query_dict, sort_keys=True)
-            result = self._call_reconciler(query_dict_json, method)
-            results_dict[k] = result['_']
+        return dict([(q.label, result['_'])
+                     for (q, result) in zip(queries, results)])
 
-        return results_dict
+    def _send_queries(self, queries_dict, method='GET'):
+        with self.instrumentation.timer('serialize'):
+            queries_json = json.dumps(queries_dict)
+        return self._query_reconciler(queries_json, method)
 
     def reconcile(self, queries, method='GET', query_by_query=False):
 
@@ -155,45 +522,98 @@ class PeriodoReconciler(object):
 
         queries_dict = OrderedDict([q.to_key_value() for q in queries])
 
-        if method.upper() == 'GET':
-            r = requests.get(self.base_url, params={
-                             'queries': json.dumps(queries_dict)})
-        elif method.upper() == 'POST':
-            r = requests.post(self.base_url, data={
-                              'queries': json.dumps(queries_dict)})
+        if self.batcher is not None:
+            return self.batcher.run(
+                queries_dict,
+                lambda batch: self._send_queries(batch, method),
+                method)
 
-        if r.status_code == 200:
-            return r.json()
-        else:
-            r.raise_for_status()
+        return self._send_queries(queries_dict, method)
 
     def suggest_properties(self):
-        r = requests.get(urllib.parse.urljoin(
+        r = self._request('GET', urllib.parse.urljoin(
             self.base_url, '/suggest/properties'))
         if r.status_code == 200:
             return r.json()['result']
 
     def suggest_entities(self, prefix):
-        r = requests.get(urllib.parse.urljoin(
+        if self.suggest_cache is not None:
+            result = self.suggest_cache.get(prefix)
+            if result is not None:
+                return result
+
+        r = self._request('GET', urllib.parse.urljoin(
             self.base_url, '/suggest/entities'), params={
                 'prefix': prefix
         })
         if r.status_code == 200:
-            return r.json()['result']
+            result = r.json()['result']
+            if self.suggest_cache is not None:
+                self.suggest_cache.set(prefix, result)
+            return result
 
     def preview_period(self, period_id, flyout=False):
+        store = self.preview_store
+        stored = None
+        if store is not None:
+            stored = store.get(period_id, flyout)
+            if stored is not None and stored.fresh:
+                self.instrumentation.count('previews_stored')
+                return stored.body
+
         params = {'id': period_id}
         if flyout:
             params['flyout'] = True
 
+        # ask for the body only if it has changed since it was stored
+        headers = {}
+        if stored is not None:
+            if stored.etag is not None:
+                headers['If-None-Match'] = stored.etag
+            if stored.last_modified is not None:
+                headers['If-Modified-Since'] = stored.last_modified
+
         url = urllib.parse.urljoin(self.base_url, '/preview')
-        r = requests.get(urllib.parse.urljoin(
-            self.base_url, '/preview'), params=params)
+        r = self._request('GET', url, params=params, headers=headers)
+        if r.status_code == 304 and stored is not None:
+            self.instrumentation.count('previews_revalidated')
+            store.touch(period_id, flyout)
+            return stored.body
         if r.status_code == 200:
+            if store is not None:
+                store.set(period_id, flyout, r.content,
+                          r.headers.get('ETag'),
+                          r.headers.get('Last-Modified'))
             return r.content
         else:
             r.raise_for_status()
 
+    def preview_periods(self, period_ids, flyout=False, workers=None):
+        """
+        the previews of period_ids, as an OrderedDict of id -> body
+
+        Each distinct id is fetched once, workers (by default
+        self.workers) at a time, and through self.preview_store if set;
+        the first failure is raised.
+        """
+        period_ids = list(OrderedDict.fromkeys(period_ids))
+        workers = workers or self.workers
+
+        if workers > 1 and len(period_ids) > 1:
+            def fetch(period_id):
+                return self.preview_period(period_id, flyout)
+
+            if workers == self.workers:
+                bodies = list(self._get_executor().map(fetch, period_ids))
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    bodies = list(executor.map(fetch, period_ids))
+        else:
+            bodies = [self.preview_period(period_id, flyout)
+                      for period_id in period_ids]
+
+        return OrderedDict(zip(period_ids, bodies))
+
 
 class CsvReconciler(object):
 
@@ -209,7 +629,15 @@ class CsvReconciler(object):
                  page_size=1000,
                  query_by_query=True,
                  match_column_prefix="",
-                 match_top_candidate=True):
+                 match_top_candidate=True,
+                 dedup=True,
+                 streaming=False,
+                 method='post',
+                 instrumentation=None,
+                 checkpoint=None,
+                 resume=False,
+                 prefilter=None,
+                 previous=None):
         """
         """
 
@@ -225,6 +653,28 @@ class CsvReconciler(object):
         self.query_by_query = query_by_query
         self.match_column_prefix = match_column_prefix
         self.match_top_candidate = match_top_candidate
+        self.dedup = dedup
+        # spill first-pass rows to a temporary file instead of
+        # holding them all in memory
+        self.streaming = streaming
+        # HTTP method for the reconciler calls
+        self.method = method
+        # timers and counters, shared with p_recon's by default
+        if instrumentation is None:
+            instrumentation = getattr(p_recon, 'instrumentation',
+                                      NullInstrumentation())
+        self.instrumentation = instrumentation
+        # optional path of a CheckpointJournal recording each page's
+        # responses, and whether to replay the pages already in it
+        self.checkpoint = checkpoint
+        self.resume = resume
+        # optional QueryFilter of the queries not to send at all, and
+        # counts of the rows it skipped by reason
+        self.prefilter = prefilter
+        self.skip_counts = Counter()
+        # optional PreviousOutput of an earlier run, whose matches are
+        # reused for the rows it has unchanged
+        self.previous = previous
 
         # if the query matches any entry in ignored_queries,
         # throw out the match
@@ -237,7 +687,16 @@ class CsvReconciler(object):
         except StopIteration as e:
             self.ignored_queries_set = set()
 
-        self.reader = csv.DictReader(csvfile)
+        # compute the columns names for the match results, which
+        # have an optional prefix (match_column_prefix)
+
+        self.match_column_names = OrderedDict(
+            [(name, f"{self.match_column_prefix}{name}")
+             for name in CsvReconciler.match_column_fields])
+
+        self.reader = self._make_reader(csvfile)
+        # computed on first use by _output_fieldnames
+        self._fieldnames = None
 
         # check that query, location, start, stop are in fieldnames
         # TO DO: I may want to move away from using assert
@@ -252,62 +711,364 @@ class CsvReconciler(object):
             'stop': stop
         })
 
-        # compute the columns names for the match results, which
-        # have an optional prefix (match_column_prefix)
-
-        self.match_column_names = OrderedDict(
-            [(name, f"{self.match_column_prefix}{name}")
-             for name in CsvReconciler.match_column_fields])
-
         # initialize a summary count of the matches
         self.match_summary = Counter()
 
-    def _transpose_query(self, q):
+        # responses for each distinct query tuple seen so far (when dedup
+        # is on) and counts of rows vs queries sent to the reconciler
+        self._responses_for_key = dict()
+        self.dedup_stats = Counter()
+
+        if self.previous is not None:
+            self.previous.load(self)
+
+    def _make_reader(self, csvfile):
         """
-        transpose only if there is a single ","
+        the reader of the input rows, with a fieldnames attribute
         """
+        return csv.DictReader(csvfile)
+
+    def _transpose_query(self, q):
         if not self.transpose_query:
             return q
+        return transpose_terms(q)
+
+    def _query_key(self, row):
+        """
+        the tuple of values that determines the reconciler's response
+        for a row: the (transposed) query followed by the property values
+        """
+        return ((self._transpose_query(row[self.query]),) +
+                tuple(row[v] for v in self.included_properties.values()))
+
+    def _rquery_for_key(self, key, label):
+        return RQuery(
+            key[0],
+            label=label,
+            properties=[
+                RProperty(p, v) for (p, v)
+                in zip(self.included_properties.keys(), key[1:])
+            ]
+        )
+
+    def _rows(self):
+        """
+        the input rows, timing the CSV parsing
+        """
+        timer = self.instrumentation.timer
+        rows = iter(self.reader)
+        while True:
+            with timer('csv_parse'):
+                row = next(rows, None)
+            if row is None:
+                return
+            self.instrumentation.count('rows')
+            yield row
+
+    def _fingerprint(self):
+        """
+        the settings that determine the responses for each page, which
+        must not change between a run and its resumption
+        """
+        fingerprint = {
+            'input': getattr(self.csvfile, 'name', None),
+            'fieldnames': self.reader.fieldnames,
+            'query': self.query,
+            'properties': self.included_properties,
+            'transpose_query': self.transpose_query,
+            'page_size': self.page_size,
+            'dedup': self.dedup
+        }
+        if self.prefilter is not None:
+            fingerprint['prefilter'] = self.prefilter.describe()
+        if self.previous is not None:
+            fingerprint['previous'] = self.previous.path
+        fingerprint['reconciler'] = self._reconciler_identity()
+        return fingerprint
+
+    def _reconciler_identity(self):
+        """
+        what tells apart the reconcilers whose responses could differ: the
+        service's URL or the dataset file, and the version of the dataset
+        (as given to the cache, or of LocalPeriodoReconciler's periods)
+        """
+        dataset_version = getattr(self.p_recon, 'dataset_version', None)
+        if dataset_version is None:
+            dataset_version = getattr(getattr(self.p_recon, 'cache', None),
+                                      'dataset_version', None)
+        return {'host': getattr(self.p_recon, 'base_url', None),
+                'dataset': getattr(self.p_recon, 'path', None),
+                'dataset_version': dataset_version}
+
+    def _replay_page(self, i, journal=None):
+        """
+        the responses recorded for page i in journal, if any
+        """
+        if journal is not None:
+            responses = journal.replay(i)
+            if responses is not None:
+                self.instrumentation.count('pages_replayed')
+                return responses
 
-        terms = [term.strip() for term in q.split(",")]
-        if (len(terms) == 2):
-            return terms[1] + " " + terms[0]
+    def _reconcile_page(self, i, queries, journal=None):
+        """
+        reconcile the queries of page i, or replay the responses
+        recorded for the page in journal
+        """
+        responses = self._replay_page(i, journal)
+        if responses is not None:
+            return responses
+
+        if len(queries):
+            with self.instrumentation.timer('reconcile'):
+                responses = self.p_recon.reconcile(
+                    queries,
+                    method=self.method,
+                    query_by_query=self.query_by_query)
         else:
-            return q
+            responses = dict()
 
-    def results_with_rows(self):
+        if journal is not None:
+            journal.record(i, responses)
+        return responses
+
+    async def _areconcile_page(self, i, queries, journal=None):
+        """
+        _reconcile_page, awaiting an async p_recon
+        """
+        responses = self._replay_page(i, journal)
+        if responses is not None:
+            return responses
+
+        if len(queries):
+            with self.instrumentation.timer('reconcile'):
+                responses = await self.p_recon.reconcile(
+                    queries,
+                    method=self.method,
+                    query_by_query=self.query_by_query)
+        else:
+            responses = dict()
+
+        if journal is not None:
+            journal.record(i, responses)
+        return responses
+
+    def _open_journal(self):
+        if self.checkpoint is not None:
+            return CheckpointJournal(self.checkpoint, self._fingerprint(),
+                                     resume=self.resume)
+
+    def _build_page(self, page, trim=False):
+        """
+        the queries to send for page, and a function taking their
+        responses to the page's (row, response) pairs -- (row,
+        MatchResult) pairs if trim
+        """
+        with self.instrumentation.timer('query_build'):
+            if self.previous is not None:
+                return self._previous_page(page, trim)
+            return self._new_page(page, trim)
+
+    def _new_page(self, page, trim=False):
+        if self.dedup:
+            return self._dedup_page(page, trim)
+        else:
+            return self._plain_page(page, trim)
+
+    def _previous_result(self, row):
+        # rows the prefilter skips are left to it, to be counted
+        if (self.prefilter is not None and
+                self.prefilter.reason(row[self.query]) is not None):
+            return None
+        return self.previous.lookup(row)
+
+    def _previous_page(self, page, trim=False):
+        """
+        like _new_page, but the rows found in self.previous keep their
+        earlier MatchResult -- which, with dedup and trim, also stands
+        for their query tuple on the other rows -- and only the rest are
+        reconciled
+        """
+        reused = [self._previous_result(row) for row in page]
+        if self.dedup and trim:
+            for (row, result) in zip(page, reused):
+                if result is not None:
+                    self._responses_for_key.setdefault(
+                        self._query_key(row), result)
+
+        (queries, fan_out) = self._new_page(
+            [row for (row, result) in zip(page, reused) if result is None],
+            trim)
+
+        def merged(responses):
+            fresh = iter(fan_out(responses))
+            n_reused = sum(result is not None for result in reused)
+            self.dedup_stats.update(rows=n_reused, reused=n_reused)
+            return [next(fresh) if result is None else (row, result)
+                    for (row, result) in zip(page, reused)]
+
+        return (queries, merged)
+
+    def _results_with_rows(self, trim=False):
 
         # bin the input rows into pages and then feed the pages
         # to the reconciler
         # from the reconciler, yield each result
 
-        for (i, page) in enumerate(grouper(self.reader, self.page_size)):
-            queries = []
+        journal = self._open_journal()
+        try:
+            for (i, page) in enumerate(grouper(self._rows(),
+                                               self.page_size)):
+                (queries, fan_out) = self._build_page(page, trim)
+                responses = self._reconcile_page(i, queries, journal)
+                yield from fan_out(responses)
+        finally:
+            if journal is not None:
+                journal.close()
+
+    def results_with_rows(self):
+        """
+        the (row, reconciler response) pairs of the input rows, in order
+
+        The rows reused from self.previous have no response; they come
+        with their earlier MatchResult instead.
+        """
+        return self._results_with_rows()
+
+    async def _aresults_with_rows(self, trim=False):
+        journal = self._open_journal()
+        try:
+            for (i, page) in enumerate(grouper(self._rows(),
+                                               self.page_size)):
+                (queries, fan_out) = self._build_page(page, trim)
+                responses = await self._areconcile_page(i, queries, journal)
+                for (row, response) in fan_out(responses):
+                    yield (row, response)
+        finally:
+            if journal is not None:
+                journal.close()
+
+    def aresults_with_rows(self):
+        """
+        results_with_rows as an async iterator, for a p_recon such as
+        AsyncPeriodoReconciler whose reconcile is a coroutine; the
+        consumer's own awaits run while each page is being reconciled
+        """
+        return self._aresults_with_rows()
+
+    def _skipped(self, page):
+        """
+        for each row of page, whether self.prefilter skips its query
+        """
+        if self.prefilter is None:
+            return [False] * len(page)
+
+        skipped = []
+        for row in page:
+            reason = self.prefilter.reason(row[self.query])
+            if reason is not None:
+                self.skip_counts[reason] += 1
+            skipped.append(reason is not None)
+        return skipped
+
+    def _skipped_response(self, trim):
+        """
+        what a row whose query self.prefilter skips gets in place of a
+        response
+        """
+        return EMPTY_MATCH if trim else {'result': []}
+
+    def _plain_page(self, page, trim=False):
 
-            # TO DO: I might be unnecessarily reproducing the page in memory
-            page_dict = OrderedDict()
+        skipped = self._skipped(page)
+        # the rows' positions on the page serve as labels
+        queries = [self._rquery_for_key(self._query_key(row), str(j))
+                   for (j, (row, skip)) in enumerate(zip(page, skipped))
+                   if not skip]
 
-            for (j, row) in enumerate(page):
-                label = str(j)
-                page_dict[label] = row
+        def fan_out(responses):
+            self.dedup_stats.update(rows=len(page), queries=len(queries))
+            return [(row, self._skipped_response(trim) if skip
+                     else responses[str(j)])
+                    for (j, (row, skip)) in enumerate(zip(page, skipped))]
 
-                queries.append(RQuery(
-                    self._transpose_query(row[self.query]),
-                    label=label,
-                    properties=[
-                        RProperty(p, row[v]) for (p, v)
-                        in self.included_properties.items()
-                    ]
-                ))
+        return (queries, fan_out)
 
-            responses = self.p_recon.reconcile(
-                queries,
-                method='post',
-                query_by_query=self.query_by_query)
+    def _dedup_page(self, page, trim=False):
+        """
+        like _plain_page but only sends each distinct query tuple
+        to the reconciler once, across all pages, and fans the response
+        back out to the rows in their original order
 
-            for (label, row) in page_dict.items():
-                # print ('\r results_with_rows', i, label, end="")
-                yield(row, responses[label])
+        If trim, only the response's MatchResult is kept for the rest of
+        the run, and fanned out.
+        """
+        skipped = self._skipped(page)
+        keys = [self._query_key(row) for row in page]
+
+        # labels for the query tuples not seen on an earlier page
+        labels = OrderedDict()
+        for (key, skip) in zip(keys, skipped):
+            if (not skip and key not in self._responses_for_key and
+                    key not in labels):
+                labels[key] = str(len(labels))
+
+        queries = [self._rquery_for_key(key, label)
+                   for (key, label) in labels.items()]
+
+        def fan_out(responses):
+            for (key, label) in labels.items():
+                self._responses_for_key[key] = (
+                    self._match_result(responses[label]) if trim
+                    else responses[label])
+            self.dedup_stats.update(rows=len(page), queries=len(labels))
+            return [(row, self._skipped_response(trim) if skip
+                     else self._responses_for_key[key])
+                    for (row, key, skip) in zip(page, keys, skipped)]
+
+        return (queries, fan_out)
+
+    @property
+    def dedup_ratio(self):
+        """
+        rows per query sent to the reconciler
+        """
+        if not self.dedup_stats['queries']:
+            return None
+        return self.dedup_stats['rows'] / self.dedup_stats['queries']
+
+    def _match_result(self, response):
+        return match_result(response, self.match_top_candidate)
+
+    def _match_row(self, row, response):
+        """
+        add the match_* columns for response (a reconciler response or
+        its MatchResult) to row
+        """
+        if not isinstance(response, MatchResult):
+            response = self._match_result(response)
+        (candidates_count, match_num, match_id, match_name) = response
+
+        if match_id:
+            # keep track of how many times a given query
+            # maps to a (match_id, match_name) tuple
+            (self.matches_for_query[row[self.query]]
+                .update([(match_id, match_name)]))
+
+        row[self.match_column_names['candidates_count']] = candidates_count
+
+        row[self.match_column_names["match_num"]] = match_num
+        row[self.match_column_names["match_name"]] = match_name
+        row[self.match_column_names["match_id"]] = match_id
+        row[self.match_column_names["match_fallback_id"]] = ''
+        row[self.match_column_names["match_fallback_name"]] = ''
+
+        # eliminate results in which the query is in ignored_queries
+
+        if row[self.query] in self.ignored_queries_set:
+            row[self.match_column_names["match_num"]] = 0
+            row[self.match_column_names["match_name"]] = ''
+            row[self.match_column_names["match_id"]] = ''
 
     def _matches(self, results_with_rows=None):
         """
@@ -321,102 +1082,113 @@ class CsvReconciler(object):
         # return matches from the entire CSV if
         # we're not processing the inputted subset of results
         if results_with_rows is None:
-            results_with_rows = self.results_with_rows()
+            results_with_rows = self._results_with_rows(trim=True)
 
         # compute a counter on the matches in the loop
         # mapping query to match_id, match_name
         self.matches_for_query = defaultdict(Counter)
 
         for (row, response) in results_with_rows:
-            results = response['result']
-            matching_results = [
-                result for result in results if result['match']]
-            match_num = len(matching_results)
-
-            # I think that number of matches must be 0 or 1
-            # otherwise: a bug in the reconciler
-            assert match_num < 2
+            with self.instrumentation.timer('matches'):
+                self._match_row(row, response)
+            yield (row)
 
-            if (match_num == 1) or (self.match_top_candidate and len(results)):
-                match_name = results[0]['name']
-                match_id = results[0]['id']
+    def _output_fieldnames(self):
+        if self._fieldnames is None:
+            self._fieldnames = (self.reader.fieldnames +
+                                list(self.match_column_names.values()))
+        return self._fieldnames
 
-                # keep track of how many times a given query
-                # maps to a (match_id, match_name) tuple
-                (self.matches_for_query[row[self.query]]
-                    .update([(match_id, match_name)]))
+    def _spill_values(self, row):
+        return [row[f] for f in self._output_fieldnames()]
 
-            else:
-                match_name = ''
-                match_id = ''
+    def _row_from_spill(self, values):
+        return dict(zip(self._output_fieldnames(), values))
 
-            row[self.match_column_names['candidates_count']] = len(results)
-
-            row[self.match_column_names["match_num"]] = match_num
-            row[self.match_column_names["match_name"]] = match_name
-            row[self.match_column_names["match_id"]] = match_id
-            row[self.match_column_names["match_fallback_id"]] = ''
-            row[self.match_column_names["match_fallback_name"]] = ''
+    def _write_spill(self, spill, rows):
+        """
+        write rows to the text file spill, one JSON list of their
+        _spill_values per line, so that the None values of short rows
+        and the int match columns read back as they were
+        """
+        for row in rows:
+            spill.write(json.dumps(self._spill_values(row)))
+            spill.write('\n')
 
-            # eliminate results in which the query is in ignored_queries
+    def _read_spill(self, spill):
+        for line in spill:
+            yield self._row_from_spill(json.loads(line))
 
-            if row[self.query] in self.ignored_queries_set:
-                row[self.match_column_names["match_num"]] = 0
-                row[self.match_column_names["match_name"]] = ''
-                row[self.match_column_names["match_id"]] = ''
+    def _spilled(self, rows):
+        """
+        write rows to a temporary file as they come in and then read
+        them back, so that only one row is in memory at a time
+        """
+        with tempfile.TemporaryFile('w+', encoding='utf-8') as spill:
+            self._write_spill(spill, rows)
+            spill.seek(0)
+            yield from self._read_spill(spill)
 
-            yield (row)
+    def _fallback_row(self, row):
+        """
+        fill in the match_fallback_* columns of row and count it in
+        self.match_summary
+        """
+        if not row[self.match_column_names["match_id"]]:
+            # set as fallback as the most common match
+            # for the same query term
+            query = row[self.query]
+            c = self.matches_for_query[query].most_common(1)
+            if len(c):
+                ((match_id, match_name), count) = c[0]
+                row[(self
+                     .match_column_names["match_fallback_id"])] = match_id
+                row[(self
+                     .match_column_names
+                     ["match_fallback_name"])] = match_name
+
+        self.match_summary.update([(
+            row[self.query],
+            row[self.location] if self.location is not None else '',
+            row[self.start] if self.start is not None else '',
+            row[self.stop] if self.stop is not None else '',
+            row[self.match_column_names["match_num"]],
+            row[self.match_column_names["match_name"]],
+            row[self.match_column_names["match_id"]],
+            row[self.match_column_names["candidates_count"]],
+            row[self.match_column_names["match_fallback_id"]],
+            row[self.match_column_names["match_fallback_name"]]
+        )])
 
     def matches(self, results_with_rows=None):
         """
-        _matches is the first pass
+        _matches is the first pass; the fallbacks can only be computed
+        once all the rows have been through it
         """
 
-        rows = list(self._matches(results_with_rows))
+        if self.streaming:
+            rows = self._spilled(self._matches(results_with_rows))
+        else:
+            rows = list(self._matches(results_with_rows))
         self.match_summary = Counter()
 
         # let's now calculate fallback for rows
         # without matches
         for row in rows:
-            if not row[self.match_column_names["match_id"]]:
-                # set as fallback as the most common match
-                # for the same query term
-                query = row[self.query]
-                c = self.matches_for_query[query].most_common(1)
-                if len(c):
-                    ((match_id, match_name), count) = c[0]
-                    row[(self
-                         .match_column_names["match_fallback_id"])] = match_id
-                    row[(self
-                         .match_column_names
-                         ["match_fallback_name"])] = match_name
-
-            self.match_summary.update([(
-                row[self.query],
-                row[self.location] if self.location is not None else '',
-                row[self.start] if self.start is not None else '',
-                row[self.stop] if self.stop is not None else '',
-                row[self.match_column_names["match_num"]],
-                row[self.match_column_names["match_name"]],
-                row[self.match_column_names["match_id"]],
-                row[self.match_column_names["candidates_count"]],
-                row[self.match_column_names["match_fallback_id"]],
-                row[self.match_column_names["match_fallback_name"]]
-            )])
+            with self.instrumentation.timer('fallback'):
+                self._fallback_row(row)
             yield row
 
     def to_csv(self, csvfile, rows, fieldnames=None):
         if fieldnames is None:
-            fieldnames = (
-                self.reader.fieldnames +
-                list(self.match_column_names.values())
-            )
+            fieldnames = self._output_fieldnames()
 
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
         writer.writeheader()
         for row in rows:
-            writer.writerow(row)
+            with self.instrumentation.timer('to_csv'):
+                writer.writerow(row)
 
     def match_summary_to_csv(self, output):
         """
@@ -0,0 +1,344 @@
+import asyncio
+import inspect
+import json
+import urllib.parse
+from collections import OrderedDict
+
+try:
+    import aiohttp
+    from multidict import CIMultiDict, CIMultiDictProxy
+    from yarl import URL
+except ImportError:
+    aiohttp = None
+
+from . import RETRY_STATUS_CODES, CACHE_MAX_SIZE
+from .cache import (MemoryCache, CachedError, is_permanent_error,
+                    has_candidates)
+from .instrument import NullInstrumentation
+
+__all__ = ['AsyncPeriodoReconciler', 'AsyncCache']
+
+
+class AsyncCache(object):
+    """
+    an async front for a blocking cache such as SqliteCache, running its
+    get and set in the event loop's default executor
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __repr__(self):
+        return """AsyncCache({!r})""".format(self.cache)
+
+    async def get(self, key):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.cache.get, key)
+
+    async def set(self, key, value, ttl=None):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.cache.set, key, value, ttl)
+
+
+class AsyncPeriodoReconciler(object):
+    """
+    asyncio counterpart of PeriodoReconciler, on an aiohttp connection
+    pool
+
+    Use it as an async context manager, or call close() when done:
+
+        async with AsyncPeriodoReconciler(host) as a_recon:
+            responses = await a_recon.reconcile(queries,
+                                                query_by_query=True)
+
+    At most concurrency requests are in flight at once, identical
+    queries in flight at the same time are only sent once, and
+    responses are kept in memory and in cache, with the same policy as
+    PeriodoReconciler's for responses without candidates and failures.
+
+
+    Parameters
+    ----------
+    host : str
+        host of the reconciliation service
+    protocol : str
+        'http' or 'https'
+    cache : optional
+        persistent cache; either with coroutine get and set methods or a
+        blocking one such as SqliteCache, which is wrapped in AsyncCache
+    concurrency : int
+        maximum number of requests in flight
+    timeout : float, optional
+        seconds to wait for each response
+    max_retries : int
+        number of times to retry connection errors, timeouts and 5xx
+        responses
+    backoff_factor : float
+        retries sleep for backoff_factor * 2 ** (retry number - 1) seconds
+    instrumentation : Instrumentation, optional
+        timers and counters
+    memory : MemoryCache, optional
+        in-process cache of responses
+    negative_ttl, error_ttl : float, optional
+        as for PeriodoReconciler
+    suggest_cache : SuggestCache, optional
+        cache of suggest_entities results
+    preview_store : PreviewStore, optional
+        store of preview_period bodies, used in the event loop's default
+        executor
+
+    """
+
+    def __init__(self, host='localhost:8142', protocol='http', cache=None,
+                 concurrency=10, timeout=None, max_retries=3,
+                 backoff_factor=0.5, instrumentation=None, memory=None,
+                 negative_ttl=3600.0, error_ttl=60.0, suggest_cache=None,
+                 preview_store=None):
+        if aiohttp is None:
+            raise ImportError("AsyncPeriodoReconciler needs aiohttp: "
+                              "pip install periodo_reconciler[async]")
+
+        self.host = host
+        self.protocol = protocol
+        self.base_url = '{}://{}/'.format(protocol, host)
+        if cache is not None and not inspect.iscoroutinefunction(cache.get):
+            cache = AsyncCache(cache)
+        self.cache = cache
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        if instrumentation is None:
+            instrumentation = NullInstrumentation()
+        self.instrumentation = instrumentation
+
+        # made on first use, inside the running event loop
+        self._session = None
+        self._semaphore = None
+
+        # responses (and permanent failures) by QueryKey
+        if memory is None:
+            memory = MemoryCache(max_entries=CACHE_MAX_SIZE)
+        self.memory = memory
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        self.suggest_cache = suggest_cache
+        self.preview_store = preview_store
+        # tasks fetching a query, so that concurrent identical queries
+        # are only sent once
+        self._in_flight = dict()
+
+    def __repr__(self):
+        return ("""AsyncPeriodoReconciler(host={}, protocol={})"""
+                .format(json.dumps(self.host),
+                        json.dumps(self.protocol)))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def _request(self, method, url, **kwargs):
+        """
+        send a request, retrying as configured, and return its status,
+        body and headers; raises aiohttp.ClientResponseError for a final
+        4xx or 5xx status
+        """
+        session = self._get_session()
+
+        for attempt in range(self.max_retries + 1):
+            retry = attempt < self.max_retries
+            try:
+                async with self._semaphore:
+                    with self.instrumentation.timer('http'):
+                        async with session.request(method, url,
+                                                   **kwargs) as r:
+                            body = await r.read()
+                            self.instrumentation.count('requests_sent')
+                            self.instrumentation.count('bytes_received',
+                                                       len(body))
+                            if not (retry and
+                                    r.status in RETRY_STATUS_CODES):
+                                r.raise_for_status()
+                                return (r.status, body, r.headers)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if not retry:
+                    raise
+
+            self.instrumentation.count('retries')
+            await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def _query_reconciler(self, queries_json, method='GET'):
+        if method.upper() == 'GET':
+            (status, body, _) = await self._request(
+                'GET', self.base_url, params={'queries': queries_json})
+        elif method.upper() == 'POST':
+            (status, body, _) = await self._request(
+                'POST', self.base_url, data={'queries': queries_json})
+        return json.loads(body)
+
+    async def describe(self):
+        (status, body, _) = await self._request('GET', self.base_url)
+        return json.loads(body)
+
+    def _ttl_for(self, result):
+        if not has_candidates(result):
+            return self.negative_ttl
+        return None
+
+    async def _fetch(self, query_key, method='GET'):
+        self.instrumentation.count('lru_misses')
+        with self.instrumentation.timer('serialize'):
+            query_dict_json = query_key.json
+
+        if self.cache is not None:
+            result = await self.cache.get(query_dict_json)
+            if result is not None:
+                self.instrumentation.count('cache_hits')
+                self.memory.set(query_key, result, self._ttl_for(result))
+                return result
+            self.instrumentation.count('cache_misses')
+
+        try:
+            result = await self._query_reconciler(query_dict_json, method)
+        except aiohttp.ClientResponseError as e:
+            if self.error_ttl is not None and is_permanent_error(e.status):
+                request_info = e.request_info
+                self.memory.set(
+                    query_key,
+                    CachedError(e.status, e.message,
+                                str(request_info.real_url),
+                                request_info.method),
+                    self.error_ttl)
+            raise
+
+        ttl = self._ttl_for(result)
+        self.memory.set(query_key, result, ttl)
+        if self.cache is not None:
+            await self.cache.set(query_dict_json, result, ttl)
+        return result
+
+    async def _call_reconciler(self, query_key, method='GET'):
+        self.instrumentation.count('lru_lookups')
+        result = self.memory.get(query_key)
+        if isinstance(result, CachedError):
+            self.instrumentation.count('errors_cached')
+            url = URL(result.url)
+            request_info = aiohttp.RequestInfo(
+                url, result.method, CIMultiDictProxy(CIMultiDict()), url)
+            raise aiohttp.ClientResponseError(
+                request_info, (), status=result.status,
+                message=result.message)
+        if result is not None:
+            return result
+
+        task = self._in_flight.get(query_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(query_key, method))
+            self._in_flight[query_key] = task
+            task.add_done_callback(
+                lambda _: self._in_flight.pop(query_key, None))
+        # a cancelled caller must not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def _reconcile_query_by_query(self, queries, method='GET'):
+        results = await asyncio.gather(*[
+            self._call_reconciler(q.key, method) for q in queries])
+        return dict([(q.label, result['_'])
+                     for (q, result) in zip(queries, results)])
+
+    async def reconcile(self, queries, method='GET', query_by_query=False):
+
+        if query_by_query:
+            return await self._reconcile_query_by_query(queries, method)
+
+        queries_dict = OrderedDict([q.to_key_value() for q in queries])
+        with self.instrumentation.timer('serialize'):
+            queries_json = json.dumps(queries_dict)
+        return await self._query_reconciler(queries_json, method)
+
+    async def suggest_properties(self):
+        (status, body, _) = await self._request('GET', urllib.parse.urljoin(
+            self.base_url, '/suggest/properties'))
+        return json.loads(body)['result']
+
+    async def suggest_entities(self, prefix):
+        if self.suggest_cache is not None:
+            result = self.suggest_cache.get(prefix)
+            if result is not None:
+                return result
+
+        (status, body, _) = await self._request('GET', urllib.parse.urljoin(
+            self.base_url, '/suggest/entities'), params={
+                'prefix': prefix
+        })
+        result = json.loads(body)['result']
+        if self.suggest_cache is not None:
+            self.suggest_cache.set(prefix, result)
+        return result
+
+    async def _in_executor(self, f, *args):
+        # for the blocking calls to self.preview_store
+        return await asyncio.get_running_loop().run_in_executor(
+            None, f, *args)
+
+    async def preview_period(self, period_id, flyout=False):
+        store = self.preview_store
+        stored = None
+        if store is not None:
+            stored = await self._in_executor(store.get, period_id, flyout)
+            if stored is not None and stored.fresh:
+                self.instrumentation.count('previews_stored')
+                return stored.body
+
+        params = {'id': period_id}
+        if flyout:
+            params['flyout'] = 'true'
+
+        # ask for the body only if it has changed since it was stored
+        headers = {}
+        if stored is not None:
+            if stored.etag is not None:
+                headers['If-None-Match'] = stored.etag
+            if stored.last_modified is not None:
+                headers['If-Modified-Since'] = stored.last_modified
+
+        url = urllib.parse.urljoin(self.base_url, '/preview')
+        (status, body, response_headers) = await self._request(
+            'GET', url, params=params, headers=headers)
+        if status == 304 and stored is not None:
+            self.instrumentation.count('previews_revalidated')
+            await self._in_executor(store.touch, period_id, flyout)
+            return stored.body
+        if store is not None:
+            await self._in_executor(
+                store.set, period_id, flyout, body,
+                response_headers.get('ETag'),
+                response_headers.get('Last-Modified'))
+        return body
+
+    async def preview_periods(self, period_ids, flyout=False):
+        """
+        the previews of period_ids, as an OrderedDict of id -> body,
+        fetching each distinct id once, concurrently, and through
+        self.preview_store if set
+        """
+        period_ids = list(OrderedDict.fromkeys(period_ids))
+        bodies = await asyncio.gather(*[
+            self.preview_period(period_id, flyout)
+            for period_id in period_ids])
+        return OrderedDict(zip(period_ids, bodies))
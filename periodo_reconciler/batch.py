@@ -0,0 +1,164 @@
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+__all__ = ['read_manifest', 'jobs_from_glob', 'reconcile_job', 'run_batch']
+
+# the reconciler of each worker process of run_batch, if it is to be
+# shared by the process's jobs (see _init_worker)
+_worker_recon = None
+
+# keys of a batch job: where the files are, and the CsvReconciler options
+JOB_FILE_KEYS = ('input', 'output', 'match_summary_output')
+JOB_OPTION_KEYS = ('query', 'location', 'start', 'stop', 'ignored_queries',
+                   'transpose_query', 'match_column_prefix',
+                   'match_top_candidate', 'page_size', 'query_by_query',
+                   'streaming')
+
+
+def _check_job(job):
+    unknown = set(job) - set(JOB_FILE_KEYS + JOB_OPTION_KEYS)
+    if len(unknown):
+        raise ValueError("unknown keys in job for {}: {}"
+                         .format(job.get('input'), sorted(unknown)))
+    for key in ('input', 'output', 'query'):
+        if key not in job:
+            raise ValueError("job is missing {}: {}"
+                             .format(key, json.dumps(job)))
+    return job
+
+
+def read_manifest(fp):
+    """
+    read a JSON manifest: a list of jobs, each an object with input,
+    output and query, and optionally match_summary_output and any of the
+    CsvReconciler options in JOB_OPTION_KEYS (location, start, stop,
+    ignored_queries, match_column_prefix, ...)
+    """
+    return [_check_job(job) for job in json.load(fp)]
+
+
+def jobs_from_glob(pattern, output_dir, summary_dir=None, **options):
+    """
+    one job per input file matching pattern, all with the same options;
+    outputs go to output_dir (and summaries to summary_dir) under the
+    input's file name, so neither may be the directory of an input
+    """
+    jobs = []
+    for path in sorted(glob.glob(pattern)):
+        in_dir = os.path.realpath(os.path.dirname(path))
+        for out_dir in (output_dir, summary_dir):
+            if out_dir is not None and os.path.realpath(out_dir) == in_dir:
+                raise ValueError("{} would overwrite the input {}"
+                                 .format(out_dir, path))
+        name = os.path.basename(path)
+        job = dict(options, input=path, output=os.path.join(output_dir,
+                                                            name))
+        if summary_dir is not None:
+            job['match_summary_output'] = os.path.join(summary_dir, name)
+        jobs.append(_check_job(job))
+    return jobs
+
+
+def _write_atomically(path, write):
+    tmp_path = '{}.tmp-{}'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        # left behind only if write failed
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _make_reconciler(host='localhost:8142', cache=None, dataset=None,
+                     dataset_version=None, workers=1, timeout=None,
+                     negative_ttl=3600.0, error_ttl=60.0,
+                     adaptive_batching=False):
+    # imported here, as the package imports this module
+    from . import (PeriodoReconciler, LocalPeriodoReconciler, SqliteCache,
+                   AdaptiveBatcher)
+
+    if dataset is not None:
+        return LocalPeriodoReconciler.from_file(dataset)
+    if cache is not None:
+        cache = SqliteCache(cache, dataset_version=dataset_version)
+    return PeriodoReconciler(
+        host=host, cache=cache, workers=workers, timeout=timeout,
+        negative_ttl=negative_ttl, error_ttl=error_ttl,
+        batcher=AdaptiveBatcher() if adaptive_batching else None)
+
+
+def reconcile_job(job, reconciler_options=None, p_recon=None):
+    """
+    reconcile the input CSV of job into its output (and summary) files,
+    with p_recon or else a reconciler made from reconciler_options, and
+    return statistics for the run
+    """
+    from . import CsvReconciler
+
+    t0 = time.perf_counter()
+    own_recon = p_recon is None
+    if own_recon:
+        p_recon = _make_reconciler(**(reconciler_options or {}))
+    options = dict([(k, v) for (k, v) in job.items()
+                    if k in JOB_OPTION_KEYS and v is not None])
+
+    with open(job['input'], newline='', encoding='utf-8') as f:
+        c_recon = CsvReconciler(f, p_recon, **options)
+        _write_atomically(job['output'], lambda out: c_recon.to_csv(
+            out, c_recon.matches()))
+
+    if job.get('match_summary_output') is not None:
+        _write_atomically(job['match_summary_output'],
+                          c_recon.match_summary_to_csv)
+
+    if own_recon:
+        if hasattr(p_recon, 'close'):
+            p_recon.close()
+        cache = getattr(p_recon, 'cache', None)
+        if cache is not None:
+            cache.close()
+
+    return {'input': job['input'],
+            'output': job['output'],
+            'rows': c_recon.dedup_stats['rows'],
+            'queries': c_recon.dedup_stats['queries'],
+            'seconds': round(time.perf_counter() - t0, 3)}
+
+
+def _init_worker(reconciler_options):
+    global _worker_recon
+    # a dataset is loaded once per process rather than once per job
+    if reconciler_options.get('dataset') is not None:
+        _worker_recon = _make_reconciler(**reconciler_options)
+
+
+def _reconcile_job_in_worker(job, reconciler_options):
+    return reconcile_job(job, reconciler_options, p_recon=_worker_recon)
+
+
+def run_batch(jobs, processes=None, **reconciler_options):
+    """
+    run reconcile_job for each of jobs across a pool of processes, and
+    yield (job, statistics or exception) for each, in the order given
+
+    With a cache (a SqliteCache path) in reconciler_options, all the
+    processes share it, so a query tuple reconciled for one file is a
+    cache hit for every other. With a dataset, each process loads it
+    once for all its jobs.
+    """
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=_init_worker,
+                             initargs=(reconciler_options,)) as executor:
+        futures = [(job, executor.submit(_reconcile_job_in_worker, job,
+                                         reconciler_options))
+                   for job in jobs]
+        for (job, future) in futures:
+            try:
+                yield (job, future.result())
+            except Exception as e:
+                yield (job, e)
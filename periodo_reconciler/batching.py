@@ -0,0 +1,133 @@
+import json
+import time
+from collections import OrderedDict
+
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+__all__ = ['AdaptiveBatcher']
+
+# status codes meaning the request was too big to be handled in one go
+SPLIT_STATUS_CODES = (413, 414)
+
+
+def timed_out(e):
+    """
+    whether the requests exception e is a timeout, including a read
+    timeout that a urllib3 Retry gave up on (which requests raises as a
+    ConnectionError)
+    """
+    if isinstance(e, requests.Timeout):
+        return True
+    reason = getattr(e.args[0], 'reason', None) if len(e.args) else None
+    return (isinstance(e, requests.ConnectionError) and
+            isinstance(reason, ReadTimeoutError))
+
+
+class AdaptiveBatcher(object):
+    """
+    send a multi-query reconcile request as a series of batches whose size
+    adapts to payload size and to how fast the server answers
+
+    A batch is split in half and retried when the server responds with 413
+    (payload too large), 414 (URI too long) or times out. The batch size
+    grows while responses come back faster than target_latency and shrinks
+    when they are slower.
+
+    Parameters
+    ----------
+    initial_size : int
+        number of queries in the first batch
+    min_size, max_size : int
+        bounds on the number of queries in a batch
+    target_latency : float
+        seconds a batch should take
+    max_get_bytes, max_post_bytes : int
+        bounds on the JSON size of the queries sent in one batch, for GET
+        (where the queries end up in the URL) and POST
+
+    """
+
+    def __init__(self, initial_size=100, min_size=1, max_size=5000,
+                 target_latency=2.0, max_get_bytes=4096,
+                 max_post_bytes=2 ** 20):
+        self.size = initial_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.max_get_bytes = max_get_bytes
+        self.max_post_bytes = max_post_bytes
+
+        # number of batches sent and number of splits after errors
+        self.batches_sent = 0
+        self.splits = 0
+
+    def __repr__(self):
+        return ("""AdaptiveBatcher(size={}, target_latency={})"""
+                .format(self.size, self.target_latency))
+
+    def _batches(self, items, max_bytes):
+        # yield batches of at most self.size items and max_bytes of JSON;
+        # self.size is read anew for each batch as it adapts
+        batch = []
+        batch_bytes = 2
+        for (k, v) in items:
+            item_bytes = len(json.dumps(k)) + len(json.dumps(v)) + 2
+            if len(batch) and (len(batch) >= self.size or
+                               batch_bytes + item_bytes > max_bytes):
+                yield batch
+                batch = []
+                batch_bytes = 2
+            batch.append((k, v))
+            batch_bytes += item_bytes
+        if len(batch):
+            yield batch
+
+    def _adapt(self, batch_size, elapsed):
+        if elapsed > self.target_latency:
+            self.size = max(self.min_size,
+                            int(batch_size * self.target_latency / elapsed))
+        elif (elapsed < self.target_latency / 2 and
+              batch_size >= self.size):
+            self.size = min(self.max_size, self.size * 2)
+
+    def _send(self, batch, send):
+        t0 = time.monotonic()
+        try:
+            result = send(OrderedDict(batch))
+        except requests.RequestException as e:
+            if isinstance(e, requests.HTTPError):
+                if (e.response is None or
+                        e.response.status_code not in SPLIT_STATUS_CODES):
+                    raise
+            elif not timed_out(e):
+                raise
+            if len(batch) < 2:
+                raise
+
+            self.splits += 1
+            half = len(batch) // 2
+            self.size = max(self.min_size, half)
+            result = self._send(batch[:half], send)
+            result.update(self._send(batch[half:], send))
+            return result
+
+        self.batches_sent += 1
+        self._adapt(len(batch), time.monotonic() - t0)
+        return result
+
+    def run(self, queries_dict, send, method='GET'):
+        """
+        send the queries in queries_dict (label -> query) in batches
+        with send, which takes an OrderedDict of queries and returns a
+        dict of results by label, and return the combined results
+        """
+        if method.upper() == 'GET':
+            max_bytes = self.max_get_bytes
+        else:
+            max_bytes = self.max_post_bytes
+
+        results = dict()
+        for batch in self._batches(queries_dict.items(), max_bytes):
+            results.update(self._send(batch, send))
+        return results
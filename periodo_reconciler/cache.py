@@ -0,0 +1,330 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+__all__ = ['SqliteCache', 'MemoryCache', 'CachedError']
+
+# persistent caches for reconciler responses
+#
+# a cache is any object with get(key) and set(key, value, ttl=None) methods,
+# where key is the canonical (sort_keys=True) query JSON and value is the
+# JSON-able response. get returns None on a miss; ttl, if given, overrides
+# the cache's own expiry for the entry.
+
+# 4xx statuses that may well go away on a retry, and so are never cached
+TRANSIENT_CLIENT_ERRORS = (408, 425, 429)
+
+
+def is_permanent_error(status):
+    """
+    whether a failed request with this status would fail again
+    """
+    return 400 <= status < 500 and status not in TRANSIENT_CLIENT_ERRORS
+
+
+def has_candidates(result):
+    """
+    whether a query_by_query response ({'_': {'result': [...]}}) has any
+    candidates
+    """
+    return bool(result.get('_', {}).get('result'))
+
+
+class CachedError(object):
+    """
+    a permanent failure for a query, kept in a MemoryCache for a short
+    while so that the query isn't sent again for every row; with the
+    url and method of the failed request, for the client to raise the
+    error again as it first did
+    """
+
+    __slots__ = ('status', 'message', 'url', 'method')
+
+    def __init__(self, status, message, url=None, method=None):
+        self.status = status
+        self.message = message
+        self.url = url
+        self.method = method
+
+    def __repr__(self):
+        return ("""CachedError({}, {})"""
+                .format(self.status, json.dumps(self.message)))
+
+
+class MemoryCache(object):
+    """
+    in-process LRU cache with optional expiry, safe to share between
+    threads; PeriodoReconciler keeps its responses in one, keyed on
+    QueryKey
+
+    Parameters
+    ----------
+    max_entries : int
+        keep at most this many entries, evicting the least recently used
+    ttl : float, optional
+        seconds after which an entry expires, unless set() is given
+        another ttl
+
+    Attributes
+    ----------
+    stats : Counter
+        hits, misses, evictions (for max_entries) and expirations
+
+    """
+
+    def __init__(self, max_entries=65536, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = Counter()
+
+        # key -> (value, expiry time or None), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return ("""MemoryCache(max_entries={}, <{} entries>)"""
+                .format(self.max_entries, len(self)))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            (value, expires) = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteCache(object):
+    """
+    on-disk cache of reconciler responses backed by SQLite
+
+    SQLite does its own file locking, so several processes (and threads,
+    each of which gets its own connection) can share one cache file.
+    The access times that max_entries evicts by are written for
+    touch_interval hits at a time, rather than on every hit.
+
+    Parameters
+    ----------
+    path : str
+        path of the SQLite database file
+    dataset_version : str, optional
+        version of the PeriodO dataset the responses come from; if it differs
+        from the version stored in the file, the cache is cleared
+    ttl : float, optional
+        seconds after which an entry expires
+    max_entries : int, optional
+        keep at most this many entries, evicting the least recently used
+    prune_interval : int
+        how many writes between checks of max_entries
+    touch_interval : int
+        how many hits to gather before writing their access times
+
+    """
+
+    def __init__(self, path, dataset_version=None, ttl=None,
+                 max_entries=None, prune_interval=256, timeout=30.0,
+                 touch_interval=256):
+        self.path = path
+        self.dataset_version = dataset_version
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_interval = prune_interval
+        self.timeout = timeout
+        self.touch_interval = touch_interval
+
+        self._local = threading.local()
+        self._writes = 0
+
+        self._lock = threading.Lock()
+        # (pid, connection) by thread, for close; close bumps the
+        # generation, so that threads open new ones
+        self._conns = dict()
+        self._generation = 0
+        # access time by key of the hits not yet written
+        self._touched = dict()
+
+        conn = self._conn()
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS meta
+                            (name TEXT PRIMARY KEY, value TEXT)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS entries
+                            (key TEXT PRIMARY KEY, value TEXT NOT NULL,
+                             accessed REAL NOT NULL, expires REAL)""")
+            conn.execute("""CREATE INDEX IF NOT EXISTS entries_accessed
+                            ON entries (accessed)""")
+
+        if dataset_version is not None:
+            self._check_dataset_version(str(dataset_version))
+
+    def __repr__(self):
+        return ("""SqliteCache({}, dataset_version={})"""
+                .format(json.dumps(self.path),
+                        json.dumps(self.dataset_version)))
+
+    def _conn(self):
+        # one connection per thread and per process: sqlite3 connections
+        # can't be shared across threads or survive a fork
+        conn = getattr(self._local, 'conn', None)
+        if (conn is None or self._local.pid != os.getpid() or
+                self._local.generation != self._generation):
+            # close may be called from another thread
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._lock:
+                stale = self._drop_stale_conns()
+                self._conns[threading.current_thread()] = (os.getpid(), conn)
+                self._local.generation = self._generation
+            for old_conn in stale:
+                old_conn.close()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _drop_stale_conns(self):
+        # forget the connections of threads that have exited, returning
+        # this process's for closing; a thread pool per page would otherwise
+        # leave a file descriptor open for every thread it ever ran
+        pid = os.getpid()
+        stale = []
+        for (thread, (conn_pid, conn)) in list(self._conns.items()):
+            if conn_pid != pid or not thread.is_alive():
+                del self._conns[thread]
+                if conn_pid == pid:
+                    stale.append(conn)
+        return stale
+
+    def _check_dataset_version(self, version):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT value FROM meta "
+                               "WHERE name = 'dataset_version'").fetchone()
+            if row is None or row[0] != version:
+                conn.execute('DELETE FROM entries')
+                conn.execute("INSERT OR REPLACE INTO meta (name, value) "
+                             "VALUES ('dataset_version', ?)", (version,))
+
+    def get(self, key):
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute('SELECT value, expires FROM entries WHERE key = ?',
+                           (key,)).fetchone()
+        if row is None:
+            return None
+
+        (value, expires) = row
+        if expires is not None and expires <= now:
+            conn.execute('DELETE FROM entries WHERE key = ? AND expires <= ?',
+                         (key, now))
+            return None
+
+        with self._lock:
+            self._touched[key] = now
+            flush = len(self._touched) >= self.touch_interval
+        if flush:
+            self._flush_touched()
+        return json.loads(value)
+
+    def _flush_touched(self):
+        """
+        write the access times of the hits gathered since the last flush
+        """
+        with self._lock:
+            (touched, self._touched) = (self._touched, dict())
+        if not len(touched):
+            return
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(
+                'UPDATE entries SET accessed = ? WHERE key = ?',
+                [(accessed, key) for (key, accessed) in touched.items()])
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+
+        self._conn().execute(
+            """INSERT OR REPLACE INTO entries (key, value, accessed, expires)
+               VALUES (?, ?, ?, ?)""",
+            (key, json.dumps(value), now, expires))
+
+        self._writes += 1
+        if (self.max_entries is not None and
+                self._writes % self.prune_interval == 0):
+            self.prune()
+
+    def prune(self):
+        """
+        drop expired entries and, if max_entries is set, the least
+        recently used entries beyond it
+        """
+        self._flush_touched()
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM entries WHERE expires <= ?',
+                         (time.time(),))
+            if self.max_entries is not None:
+                conn.execute("""DELETE FROM entries WHERE key IN
+                                (SELECT key FROM entries
+                                 ORDER BY accessed DESC
+                                 LIMIT -1 OFFSET ?)""", (self.max_entries,))
+
+    def clear(self):
+        self._conn().execute('DELETE FROM entries')
+
+    def __len__(self):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def close(self):
+        """
+        write the pending access times and close the connections of all
+        the threads of this process
+        """
+        self._flush_touched()
+        with self._lock:
+            conns = [conn for (pid, conn) in self._conns.values()
+                     if pid == os.getpid()]
+            self._conns = dict()
+            self._generation += 1
+        for conn in conns:
+            conn.close()
@@ -0,0 +1,97 @@
+import json
+import os
+
+__all__ = ['CheckpointJournal']
+
+
+class CheckpointJournal(object):
+    """
+    append-only journal of the reconciler responses for each page of a
+    CsvReconciler run, so that a run that dies can be resumed without
+    sending the finished pages again
+
+    The file is JSON lines: a header with a fingerprint of the run's
+    settings, then one {"page": i, "responses": {...}} line per page.
+    Each line is flushed and fsynced before the page's rows are used; a
+    line cut short by a crash is ignored on resume.
+
+    Parameters
+    ----------
+    path : str
+        journal file
+    fingerprint : dict
+        JSON-able description of the run; resuming a journal written
+        with a different fingerprint raises ValueError
+    resume : bool
+        load the pages already in path instead of starting afresh
+
+    """
+
+    def __init__(self, path, fingerprint, resume=False):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.pages = dict()
+
+        if resume and os.path.exists(path):
+            self._load()
+            self._file = open(path, 'a', encoding='utf-8')
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+            self._write({'fingerprint': fingerprint})
+
+    def __repr__(self):
+        return ("""CheckpointJournal({}, <{} pages>)"""
+                .format(json.dumps(self.path), len(self.pages)))
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        lines = data.split(b'\n')
+        try:
+            header = json.loads(lines[0].decode('utf-8'))
+        except ValueError:
+            header = None
+        if len(lines) < 2 or not isinstance(header, dict):
+            # the header is written first, with its newline
+            raise ValueError("corrupt checkpoint {}: no complete header"
+                             .format(self.path))
+        if header.get('fingerprint') != self.fingerprint:
+            raise ValueError(
+                "checkpoint {} was written for a different run: {} != {}"
+                .format(self.path, json.dumps(header.get('fingerprint')),
+                        json.dumps(self.fingerprint)))
+
+        # every line is written with its newline, so whatever follows
+        # the last newline is incomplete
+        end = len(lines[0]) + 1
+        for line in lines[1:-1]:
+            try:
+                entry = json.loads(line.decode('utf-8'))
+            except ValueError:
+                # the tail of a write interrupted by a crash
+                break
+            self.pages[entry['page']] = entry['responses']
+            end += len(line) + 1
+
+        # drop any partial line so that new pages append cleanly
+        if end < len(data):
+            os.truncate(self.path, end)
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def replay(self, page):
+        """
+        the stored responses for page, or None if it isn't done; each
+        page is only replayed once, so its responses are let go of
+        """
+        return self.pages.pop(page, None)
+
+    def record(self, page, responses):
+        self._write({'page': page, 'responses': responses})
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,220 @@
+import os
+import tempfile
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from .instrument import Instrumentation, NullInstrumentation
+
+__all__ = ['chunk_offsets', 'chunked_matches']
+
+# the CsvReconciler settings a chunk's worker needs to reproduce the
+# first pass of the parent's
+CHUNK_OPTION_KEYS = ('query', 'location', 'start', 'stop', 'ignored_queries',
+                     'transpose_query', 'page_size', 'query_by_query',
+                     'match_column_prefix', 'match_top_candidate', 'dedup',
+                     'method', 'prefilter')
+
+# the most bytes a header spanning lines is read to before giving up on
+# finding its end
+MAX_HEADER_BYTES = 2 ** 20
+
+# the reconciler of each worker process, made once by _init_worker
+_worker_recon = None
+
+
+def _header_length(f):
+    """
+    the length in bytes of the header of the binary CSV file f, which
+    may itself span lines; raises ValueError if a quote in it is never
+    closed
+    """
+    f.seek(0)
+    header = f.readline()
+    while header.count(b'"') % 2:
+        line = f.readline(MAX_HEADER_BYTES)
+        if not line or len(header) > MAX_HEADER_BYTES:
+            raise ValueError("unbalanced quote in the CSV header of {}"
+                             .format(getattr(f, 'name', f)))
+        header += line
+    return len(header)
+
+
+def chunk_offsets(path, chunks):
+    """
+    split the rows of the CSV file at path (after its header) into up to
+    chunks byte ranges of about the same size, returned as a list of
+    (start, end) offsets
+
+    Ranges only end at the end of a line outside any quoted field: a
+    newline inside quotes leaves an odd number of quote characters
+    before it (an escaped "" counts twice), so lines are accumulated
+    until the count of quotes is even.
+    """
+    size = os.path.getsize(path)
+    offsets = []
+    with open(path, 'rb') as f:
+        start = pos = _header_length(f)
+        f.seek(start)
+        target = start + (size - start) / max(chunks, 1)
+        quotes = 0
+        for line in f:
+            pos += len(line)
+            quotes += line.count(b'"')
+            if pos >= target and not quotes % 2:
+                offsets.append((start, pos))
+                start = pos
+                target = start + (size - start) / max(
+                    chunks - len(offsets), 1)
+                quotes = 0
+
+    if pos > start:
+        offsets.append((start, pos))
+    return offsets
+
+
+def _chunk_lines(path, start, end, encoding='utf-8'):
+    """
+    the header of the CSV file at path followed by its lines between
+    the offsets start and end
+    """
+    with open(path, 'rb') as f:
+        header_length = _header_length(f)
+        f.seek(0)
+        header = f.read(header_length)
+        yield header.decode(encoding)
+        f.seek(start)
+        pos = start
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line.decode(encoding)
+
+
+def _init_worker(reconciler_options):
+    from .batch import _make_reconciler
+
+    global _worker_recon
+    _worker_recon = _make_reconciler(**reconciler_options)
+
+
+def _first_pass(cls, path, start, end, options, encoding='utf-8',
+                instrument=False):
+    """
+    run the first pass of cls (CsvReconciler or a subclass) over one
+    chunk, spilling the rows to a temporary file; returns the file's
+    path and the chunk's matches_for_query, dedup_stats and skip_counts,
+    and, if instrument, the (seconds, calls, counters) of its
+    Instrumentation
+    """
+    instrumentation = Instrumentation() if instrument else None
+    if instrument and hasattr(_worker_recon, 'instrumentation'):
+        _worker_recon.instrumentation = instrumentation
+    c_recon = cls(_chunk_lines(path, start, end, encoding), _worker_recon,
+                  instrumentation=instrumentation, **options)
+
+    with tempfile.NamedTemporaryFile('w', newline='', encoding='utf-8',
+                                     suffix='.jsonl', delete=False) as spill:
+        c_recon._write_spill(spill, c_recon._matches())
+
+    if instrumentation is not None:
+        instrumentation = (dict(instrumentation.seconds),
+                           instrumentation.calls, instrumentation.counters)
+    return (spill.name, dict(c_recon.matches_for_query),
+            c_recon.dedup_stats, c_recon.skip_counts, instrumentation)
+
+
+def chunked_matches(c_recon, reconciler_options=None, processes=None,
+                    chunks=None, encoding='utf-8'):
+    """
+    like c_recon.matches(), but reconcile the rows of its input file in
+    chunks across a pool of processes
+
+    Each worker makes its own reconciler from reconciler_options (see
+    periodo_reconciler.batch) and runs the first pass over its chunk.
+    The matches_for_query counters of the chunks are then merged in file
+    order, so that the most common match of each query -- ties included
+    -- and so the fallbacks and c_recon.match_summary are the same as
+    for a serial run. The workers' timings and counts, if c_recon is
+    instrumented, are added to its instrumentation.
+
+
+    Parameters
+    ----------
+    c_recon : CsvReconciler
+        reading a file on disk; its checkpoint and previous options are
+        not supported
+    reconciler_options : dict, optional
+        host, cache, dataset, dataset_version, workers, timeout,
+        negative_ttl, error_ttl, adaptive_batching
+    processes : int, optional
+        size of the pool; defaults to the number of CPUs
+    chunks : int, optional
+        number of chunks to split the file into; defaults to four per
+        process
+    encoding : str
+        of the input file
+
+    Returns
+    -------
+    generator of the output rows, in input order
+
+    """
+    if c_recon.checkpoint is not None:
+        raise ValueError("checkpoints are not supported for chunked runs")
+    if c_recon.previous is not None:
+        raise ValueError("incremental runs are not supported for chunked "
+                         "runs")
+
+    path = getattr(c_recon.csvfile, 'name', None)
+    if not isinstance(path, str) or not os.path.isfile(path):
+        raise ValueError("chunked runs need the input to be a file on "
+                         "disk, not {!r}".format(c_recon.csvfile))
+
+    processes = processes or os.cpu_count() or 1
+    offsets = chunk_offsets(path, chunks or 4 * processes)
+    options = dict([(k, getattr(c_recon, k)) for k in CHUNK_OPTION_KEYS])
+    instrument = not isinstance(c_recon.instrumentation, NullInstrumentation)
+
+    with ProcessPoolExecutor(max_workers=processes,
+                             initializer=_init_worker,
+                             initargs=(reconciler_options or {},)) as pool:
+        futures = [pool.submit(_first_pass, type(c_recon), path, start, end,
+                               options, encoding, instrument)
+                   for (start, end) in offsets]
+        results = []
+        errors = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(e)
+
+    if len(errors):
+        for (spill_path, _, _, _, _) in results:
+            os.remove(spill_path)
+        raise errors[0]
+
+    c_recon.matches_for_query = defaultdict(Counter)
+    for (_, matches_for_query, dedup_stats, skip_counts,
+         instrumentation) in results:
+        for (query, counter) in matches_for_query.items():
+            c_recon.matches_for_query[query].update(counter)
+        c_recon.dedup_stats.update(dedup_stats)
+        c_recon.skip_counts.update(skip_counts)
+        if instrumentation is not None:
+            c_recon.instrumentation.merge(*instrumentation)
+
+    c_recon.match_summary = Counter()
+    spill_paths = [result[0] for result in results]
+    try:
+        for spill_path in spill_paths:
+            with open(spill_path, encoding='utf-8') as spill:
+                for row in c_recon._read_spill(spill):
+                    with c_recon.instrumentation.timer('fallback'):
+                        c_recon._fallback_row(row)
+                    yield row
+    finally:
+        for spill_path in spill_paths:
+            os.remove(spill_path)
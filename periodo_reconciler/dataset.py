@@ -0,0 +1,105 @@
+import hashlib
+import json
+from collections import namedtuple
+
+__all__ = ['Period', 'periods_from_dataset', 'read_periods',
+           'file_version', 'ARK_BASE']
+
+# PeriodO ids are relative to this base (see @base in the JSON-LD context)
+ARK_BASE = 'http://n2t.net/ark:/99152/'
+
+# the parts of a PeriodO period definition used for reconciliation
+#
+# labels holds the label followed by the localizedLabels; spatial_coverage
+# is a tuple of (id, label) pairs; start and stop are years (int) or None
+Period = namedtuple('Period', ['id', 'label', 'labels', 'spatial_coverage',
+                               'spatial_coverage_description',
+                               'start', 'stop'])
+
+
+def _year(terminus, key):
+    """
+    the year of a start or stop terminus, which is either a single year
+    or an earliestYear/latestYear range (key picks which end to use)
+    """
+    if not terminus:
+        return None
+    in_ = terminus.get('in', {})
+    year = in_.get('year', in_.get(key))
+    if year is None or year == '':
+        return None
+    return int(year)
+
+
+def _period(definition, base):
+    labels = [definition.get('label', '')]
+    for language_labels in definition.get('localizedLabels', {}).values():
+        for label in language_labels:
+            if label not in labels:
+                labels.append(label)
+
+    return Period(
+        id=base + definition['id'],
+        label=definition.get('label', ''),
+        labels=tuple(labels),
+        spatial_coverage=tuple(
+            (place.get('id', ''), place.get('label', ''))
+            for place in definition.get('spatialCoverage', [])),
+        spatial_coverage_description=definition.get(
+            'spatialCoverageDescription', ''),
+        # the outer bounds: earliest start and latest stop
+        start=_year(definition.get('start'), 'earliestYear'),
+        stop=_year(definition.get('stop'), 'latestYear'))
+
+
+def _definitions(dataset):
+    # a single period collection / authority has its definitions
+    # (or periods) at the top level; a full dataset nests them in
+    # periodCollections (or authorities)
+    for key in ('definitions', 'periods'):
+        if key in dataset:
+            yield from dataset[key].values()
+    for key in ('periodCollections', 'authorities'):
+        for collection in dataset.get(key, {}).values():
+            yield from _definitions(collection)
+
+
+def periods_from_dataset(dataset):
+    """
+    return the period definitions in a parsed PeriodO JSON-LD dataset
+
+
+    Parameters
+    ----------
+    dataset : dict
+        a PeriodO dataset, authority or period collection
+
+    Returns
+    -------
+    list of Period
+
+    """
+    context = dataset.get('@context', {})
+    if isinstance(context, dict):
+        base = context.get('@base', ARK_BASE)
+    else:
+        base = ARK_BASE
+    return [_period(definition, base)
+            for definition in _definitions(dataset)]
+
+
+def read_periods(path):
+    with open(path, encoding='utf-8') as f:
+        return periods_from_dataset(json.load(f))
+
+
+def file_version(path):
+    """
+    a version for the dataset file at path, when it has none: the
+    SHA-256 of its content
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(2 ** 16), b''):
+            digest.update(block)
+    return 'sha256:' + digest.hexdigest()
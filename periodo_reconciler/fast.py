@@ -0,0 +1,181 @@
+import csv
+import mmap
+
+from . import CsvReconciler
+
+__all__ = ['FastCsvReconciler', 'RawRow', 'mmap_lines']
+
+# characters after which a raw CSV record's line terminator is dropped
+LINE_TERMINATORS = '\r\n'
+
+# how many strings to gather before each write of the output
+WRITE_BATCH = 4096
+
+
+class RawRow(object):
+    """
+    an input row of FastCsvReconciler: its raw text and its cells, the
+    values of only the columns the reconciler reads followed by the
+    match_* columns
+
+    Indexing by column name works as for the dicts of CsvReconciler, for
+    those columns.
+    """
+
+    __slots__ = ('raw', 'cells', 'layout')
+
+    def __init__(self, raw, cells, layout):
+        self.raw = raw
+        self.cells = cells
+        self.layout = layout
+
+    def __repr__(self):
+        return """RawRow({!r})""".format(self.raw)
+
+    def __getitem__(self, name):
+        return self.cells[self.layout.slots[name]]
+
+    def __setitem__(self, name, value):
+        self.cells[self.layout.slots[name]] = value
+
+    @property
+    def match(self):
+        return self.cells[self.layout.n_columns:]
+
+    def as_dict(self):
+        """
+        the row as CsvReconciler would have it, parsing the raw text again
+        """
+        row = dict(zip(self.layout.fieldnames,
+                       next(csv.reader([self.raw]), [])))
+        row.update(zip(self.layout.match_columns, self.match))
+        return row
+
+
+class RawReader(object):
+    """
+    reads a CSV file into RawRow objects, keeping the text of each record
+    as csv.reader consumes it, line by line
+    """
+
+    def __init__(self, csvfile, columns, match_columns):
+        self._buffer = []
+        self._reader = csv.reader(self._capture(csvfile))
+
+        self.fieldnames = next(self._reader, [])
+        self.header_raw = self._take_raw()
+
+        # the position of each column read, then of each match column,
+        # in RawRow.cells
+        present = []
+        for c in columns:
+            if c in self.fieldnames and c not in present:
+                present.append(c)
+        self.match_columns = list(match_columns)
+        self.n_columns = len(present)
+        self.slots = dict((c, i) for (i, c)
+                          in enumerate(present + self.match_columns))
+        self._indexes = [self.fieldnames.index(c) for c in present]
+
+    def _capture(self, lines):
+        buffer = self._buffer
+        for line in lines:
+            buffer.append(line)
+            yield line
+
+    def _take_raw(self):
+        raw = ''.join(self._buffer).rstrip(LINE_TERMINATORS)
+        self._buffer.clear()
+        return raw
+
+    def __iter__(self):
+        n_fields = len(self.fieldnames)
+        indexes = self._indexes
+        blank = [''] * len(self.match_columns)
+        for values in self._reader:
+            raw = self._take_raw()
+            if not values:
+                # csv.DictReader skips blank lines too
+                continue
+            if len(values) > n_fields:
+                # as csv.DictWriter refuses the extra values DictReader
+                # gathers under None, when CsvReconciler writes the row
+                raise ValueError("record ending on line {} has more fields "
+                                 "than the header".format(
+                                     self._reader.line_num))
+            if len(values) < n_fields:
+                # DictReader fills in missing values with None, which
+                # is written out as ''
+                raw += ',' * (n_fields - len(values))
+                values += [None] * (n_fields - len(values))
+            yield RawRow(raw, [values[i] for i in indexes] + blank, self)
+
+
+def mmap_lines(path, encoding='utf-8'):
+    """
+    the lines of the file at path, read through a memory map
+    """
+    with open(path, 'rb') as f:
+        if not f.seek(0, 2):
+            # an empty file can't be mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b''):
+                yield line.decode(encoding)
+
+
+class _Parts(list):
+    # lets csv.writer format into a list of strings
+    write = list.append
+
+
+class FastCsvReconciler(CsvReconciler):
+    """
+    CsvReconciler for wide files: only the query, location, start and
+    stop columns are parsed into each row, the other columns pass
+    through to the output as raw text, with the match columns appended,
+    and the output is written in large batches
+
+    It takes the same arguments as CsvReconciler; csvfile can be any
+    iterable of lines, such as mmap_lines(path). The output is the same
+    CSV as CsvReconciler's, save that the input's columns keep their
+    original quoting.
+    """
+
+    def _make_reader(self, csvfile):
+        columns = [self.query, self.location, self.start, self.stop]
+        if self.previous is not None:
+            # PreviousOutput can't hash the raw text, as the earlier
+            # output may be quoted differently
+            if self.previous.key_column is None:
+                raise ValueError("FastCsvReconciler needs a key_column "
+                                 "to reuse a previous output")
+            columns.append(self.previous.key_column)
+        return RawReader(csvfile, columns, self.match_column_names.values())
+
+    def _spill_values(self, row):
+        return [row.raw] + row.cells
+
+    def _row_from_spill(self, values):
+        return RawRow(values[0], values[1:], self.reader)
+
+    def to_csv(self, csvfile, rows, fieldnames=None):
+        if fieldnames is not None:
+            return super().to_csv(csvfile, (row.as_dict() for row in rows),
+                                  fieldnames)
+
+        timer = self.instrumentation.timer
+        parts = _Parts()
+        writer = csv.writer(parts)
+
+        parts.append(self.reader.header_raw + ',')
+        writer.writerow(self.match_column_names.values())
+        n = self.reader.n_columns
+        for row in rows:
+            with timer('to_csv'):
+                parts.append(row.raw + ',')
+                writer.writerow(row.cells[n:])
+                if len(parts) >= WRITE_BATCH:
+                    csvfile.write(''.join(parts))
+                    parts.clear()
+        csvfile.write(''.join(parts))
@@ -0,0 +1,215 @@
+import csv
+import io
+from collections import Counter, OrderedDict, namedtuple
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = pd = None
+
+from . import (
+    RProperty,
+    RQuery,
+    CsvReconciler,
+    EMPTY_MATCH,
+    grouper,
+    match_result,
+    non_none_values,
+    transpose_terms
+)
+
+__all__ = ['reconcile_frame', 'ReconciledFrame']
+
+# what reconcile_frame returns: the input frame with the match columns
+# added, the match summary (as CsvReconciler.match_summary_to_csv writes
+# it) and counts of rows, queries sent and rows skipped by reason
+ReconciledFrame = namedtuple('ReconciledFrame', ['frame', 'summary',
+                                                 'stats'])
+
+
+def _as_pandas(data):
+    # e.g., a pyarrow.Table
+    if not isinstance(data, pd.DataFrame) and hasattr(data, 'to_pandas'):
+        return data.to_pandas()
+    return data
+
+
+def _as_strings(column):
+    """
+    the values of column as they would be read from a CSV file: missing
+    values as '', and whole floats -- what read_csv makes of a column of
+    integers with blanks -- without the '.0'
+    """
+    if pd.api.types.is_float_dtype(column):
+        whole = (column % 1 == 0) & (column.abs() < 2 ** 53)
+        strings = column.astype(str)
+        strings[whole] = column[whole].astype(np.int64).astype(str)
+        return strings.where(column.notna(), '')
+    return column.fillna('').astype(str)
+
+
+def _fallbacks(uniques, match_id, match_name, row_count):
+    """
+    the most common accepted (match_id, match_name) of each query, by
+    rows -- ties going to the one seen first, as with CsvReconciler's
+    Counter -- as a DataFrame indexed by query
+    """
+    accepted = match_id != ''
+    counts = (pd.DataFrame({'query': uniques['query'].to_numpy()[accepted],
+                            'id': match_id[accepted],
+                            'name': match_name[accepted],
+                            'n': row_count[accepted]})
+              .groupby(['query', 'id', 'name'], sort=False)['n']
+              .sum()
+              .reset_index())
+    if not len(counts):
+        return counts.set_index('query')
+    best = counts.groupby('query', sort=False)['n'].idxmax()
+    return counts.loc[best].set_index('query')
+
+
+def reconcile_frame(data, p_recon, query, location=None, start=None,
+                    stop=None, ignored_queries='', transpose_query=False,
+                    page_size=1000, query_by_query=True,
+                    match_column_prefix='', match_top_candidate=True,
+                    method='post', prefilter=None):
+    """
+    reconcile the rows of a DataFrame, with the same results as
+    CsvReconciler on the same data written to a CSV file
+
+    Only the distinct query tuples go through Python; the match columns,
+    the fallbacks and the summary are computed with numpy indexing and
+    pandas groupby over the whole frame.
+
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        or anything with a to_pandas method, such as a pyarrow.Table
+    p_recon : PeriodoReconciler or LocalPeriodoReconciler
+        reconciler for the distinct query tuples
+    query, location, start, stop : str
+        columns, as for CsvReconciler; their values are sent as strings,
+        with missing values as '' and whole floats as integers
+    ignored_queries, transpose_query, page_size, query_by_query,
+    match_column_prefix, match_top_candidate, method, prefilter
+        as for CsvReconciler
+
+    Returns
+    -------
+    ReconciledFrame
+        (frame, summary, stats); frame is a new DataFrame
+
+    """
+    if pd is None:
+        raise ImportError("reconcile_frame needs pandas: "
+                          "pip install periodo_reconciler[frame]")
+
+    df = _as_pandas(data)
+    properties = non_none_values({
+        'location': location,
+        'start': start,
+        'stop': stop
+    })
+    missing = [c for c in [query] + list(properties.values())
+               if c not in df.columns]
+    if len(missing):
+        raise KeyError("columns not in frame: {}".format(missing))
+
+    match_column_names = OrderedDict(
+        [(name, f"{match_column_prefix}{name}")
+         for name in CsvReconciler.match_column_fields])
+    clashes = set(df.columns) & set(match_column_names.values())
+    if len(clashes):
+        raise ValueError("frame already has columns {}"
+                         .format(sorted(clashes)))
+
+    # the values as they would be read from a CSV file
+    keys = df[[query] + list(properties.values())].apply(_as_strings)
+    keys.columns = ['query'] + list(properties)
+    keys = keys.reset_index(drop=True)
+
+    # each row's query tuple, numbered in order of first appearance;
+    # everything but the frame's match columns is worked out for the
+    # distinct tuples and only then spread out to the rows
+    codes = keys.groupby(list(keys.columns), sort=False).ngroup().to_numpy()
+    uniques = keys.drop_duplicates().reset_index(drop=True)
+    row_count = np.bincount(codes, minlength=len(uniques))
+
+    stats = Counter(rows=len(df))
+    results = [None] * len(uniques)
+    pending = []
+    for (i, values) in enumerate(uniques.itertuples(index=False,
+                                                    name=None)):
+        raw = values[0]
+        if prefilter is not None:
+            reason = prefilter.reason(raw)
+            if reason is not None:
+                results[i] = EMPTY_MATCH
+                stats['skipped_' + reason] += int(row_count[i])
+                continue
+        pending.append(RQuery(
+            transpose_terms(raw) if transpose_query else raw,
+            label=str(i),
+            properties=[RProperty(p, v)
+                        for (p, v) in zip(properties, values[1:])]))
+
+    for page in grouper(iter(pending), page_size):
+        responses = p_recon.reconcile(page, method=method,
+                                      query_by_query=query_by_query)
+        for q in page:
+            results[int(q.label)] = match_result(responses[q.label],
+                                                 match_top_candidate)
+    stats['queries'] = len(pending)
+
+    table = np.array(results, dtype=object).reshape(len(results), 4)
+    candidates_count = table[:, 0].astype(np.int64)
+    match_num = table[:, 1].astype(np.int64)
+    match_id = table[:, 2]
+    match_name = table[:, 3]
+
+    # the fallbacks count the matches of ignored queries too, as they
+    # are only dropped afterwards
+    fallbacks = _fallbacks(uniques, match_id, match_name, row_count)
+
+    queries = uniques['query']
+    c_reader = csv.reader(io.StringIO(ignored_queries))
+    ignored = queries.isin(next(c_reader, [])).to_numpy()
+    match_num = np.where(ignored, 0, match_num)
+    match_id = np.where(ignored, '', match_id)
+    match_name = np.where(ignored, '', match_name)
+
+    unmatched = match_id == ''
+    fallback_id = np.where(
+        unmatched, queries.map(fallbacks['id']).fillna(''), '')
+    fallback_name = np.where(
+        unmatched, queries.map(fallbacks['name']).fillna(''), '')
+
+    columns = {
+        'match_num': match_num,
+        'match_name': match_name,
+        'match_id': match_id,
+        'candidates_count': candidates_count,
+        'match_fallback_id': fallback_id,
+        'match_fallback_name': fallback_name
+    }
+    frame = df.copy()
+    for (name, column) in match_column_names.items():
+        frame[column] = columns[name][codes]
+
+    # a row of the summary for each distinct tuple, as the match columns
+    # follow from the tuple
+    summary = pd.DataFrame(OrderedDict(
+        [('query', queries.to_numpy())] +
+        [(name, uniques[name].to_numpy() if name in properties else '')
+         for name in ('location', 'start', 'stop')] +
+        [(name, columns[name]) for name in CsvReconciler.match_column_fields]
+        + [('row_count', row_count)]
+    ))
+    # like Counter.most_common: ties stay in first-seen order
+    summary = (summary
+               .sort_values('row_count', ascending=False, kind='stable')
+               .reset_index(drop=True))
+
+    return ReconciledFrame(frame, summary, stats)
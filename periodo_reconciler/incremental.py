@@ -0,0 +1,182 @@
+import csv
+import hashlib
+import json
+import os
+
+from . import MatchResult
+
+__all__ = ['PreviousOutput', 'write_state', 'STATE_SUFFIX']
+
+# the state file of an output is written next to it, with this suffix
+STATE_SUFFIX = '.state.json'
+
+
+def _settings(c_recon):
+    """
+    the settings of c_recon that determine each row's MatchResult, as
+    they would read back from JSON
+    """
+    settings = {
+        'query': c_recon.query,
+        'properties': c_recon.included_properties,
+        'transpose_query': c_recon.transpose_query,
+        'match_top_candidate': c_recon.match_top_candidate,
+        'match_column_prefix': c_recon.match_column_prefix
+    }
+    if c_recon.prefilter is not None:
+        settings['prefilter'] = c_recon.prefilter.describe()
+    return json.loads(json.dumps(settings))
+
+
+def write_state(path, c_recon, dataset_version=None):
+    """
+    record, next to the output CSV at path, what a later PreviousOutput
+    needs to know to reuse its matches: the dataset version, the
+    reconciliation settings and the ignored queries of c_recon's run
+    """
+    state = {
+        'dataset_version': dataset_version,
+        'settings': _settings(c_recon),
+        'ignored_queries': sorted(c_recon.ignored_queries_set)
+    }
+    with open(path + STATE_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+def _values(row, columns):
+    # DictReader fills in the values missing from short rows with None,
+    # which the output has as ''
+    return ['' if row[c] is None else row[c] for c in columns]
+
+
+def _row_hash(values):
+    return hashlib.blake2b(json.dumps(values).encode('utf-8'),
+                           digest_size=16).digest()
+
+
+class PreviousOutput(object):
+    """
+    the matches in the output CSV of an earlier run, for an incremental
+    run of CsvReconciler (its previous option): rows unchanged since
+    take their match from it instead of being reconciled again, and the
+    fallbacks and the match summary are computed over all the rows
+
+    Rows are identified by the value of key_column together with their
+    query, location, start and stop, or else by a hash of all their
+    values. Nothing is reused -- and reason says why -- unless the state
+    file of the earlier output (see write_state) has the same
+    dataset_version and settings. Rows whose query was ignored by the
+    earlier run are reconciled again, as their matches were dropped
+    from its output.
+
+
+    Parameters
+    ----------
+    path : str
+        output CSV of the earlier run; it need not exist
+    key_column : str, optional
+        column identifying each row
+    dataset_version : str, optional
+        version of the PeriodO dataset reconciled against now
+    encoding : str
+        of the earlier output
+
+    """
+
+    def __init__(self, path, key_column=None, dataset_version=None,
+                 encoding='utf-8'):
+        self.path = path
+        self.key_column = key_column
+        self.dataset_version = dataset_version
+        self.encoding = encoding
+
+        # why nothing is reused, if so
+        self.reason = None
+        # MatchResult by row identity, filled in by load
+        self._results = None
+        self._columns = None
+        self._ignored = set()
+
+    def __repr__(self):
+        return ("""PreviousOutput({}, key_column={})"""
+                .format(json.dumps(self.path), json.dumps(self.key_column)))
+
+    def __len__(self):
+        return len(self._results or ())
+
+    def _identity(self, values):
+        if self.key_column is not None:
+            return tuple(values)
+        return _row_hash(values)
+
+    def _check_state(self, c_recon):
+        """
+        the reason not to reuse the earlier output, if any
+        """
+        if not os.path.exists(self.path):
+            return 'no previous output'
+        try:
+            with open(self.path + STATE_SUFFIX, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return 'no state file'
+        if state.get('dataset_version') != self.dataset_version:
+            return 'dataset version changed'
+        if state.get('settings') != _settings(c_recon):
+            return 'settings changed'
+        self._ignored = set(state.get('ignored_queries', []))
+
+    def load(self, c_recon):
+        """
+        index the matches of the earlier output for c_recon's rows; done
+        by CsvReconciler itself
+        """
+        if self._results is not None:
+            return
+        self._results = dict()
+
+        fieldnames = c_recon.reader.fieldnames
+        if self.key_column is not None:
+            if self.key_column not in fieldnames:
+                raise ValueError("key column {} not in input"
+                                 .format(json.dumps(self.key_column)))
+            self._columns = ([self.key_column, c_recon.query] +
+                             list(c_recon.included_properties.values()))
+        else:
+            self._columns = list(fieldnames)
+
+        self.reason = self._check_state(c_recon)
+        if self.reason is not None:
+            return
+
+        names = c_recon.match_column_names
+        with open(self.path, newline='', encoding=self.encoding) as f:
+            reader = csv.DictReader(f)
+            previous_fieldnames = reader.fieldnames or []
+            if self.key_column is None:
+                same = ([c for c in previous_fieldnames
+                         if c not in names.values()] == self._columns)
+            else:
+                same = set(self._columns) <= set(previous_fieldnames)
+            if not same or not set(names.values()) <= set(
+                    previous_fieldnames):
+                self.reason = 'columns changed'
+                return
+
+            for row in reader:
+                if row[c_recon.query] in self._ignored:
+                    continue
+                self._results[self._identity(
+                    _values(row, self._columns))] = MatchResult(
+                        int(row[names['candidates_count']]),
+                        int(row[names['match_num']]),
+                        row[names['match_id']],
+                        row[names['match_name']])
+
+    def lookup(self, row):
+        """
+        the MatchResult of row in the earlier output, or None if it is
+        new or has changed
+        """
+        return self._results.get(
+            self._identity(_values(row, self._columns)))
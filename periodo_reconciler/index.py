@@ -0,0 +1,526 @@
+import bisect
+import heapq
+import json
+import math
+import re
+import unicodedata
+from array import array
+from collections import defaultdict, Counter
+
+__all__ = ['LabelIndex', 'IntervalIndex', 'SpatialIndex',
+           'normalize_label', 'label_words', 'label_trigrams',
+           'bitmap_from_docs', 'docs_from_bitmap']
+
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize_label(s):
+    """
+    fold case, strip diacritics and collapse whitespace, so that, e.g.,
+    'Bashkëkohore' and 'bashkekohore' normalize to the same string
+    """
+    s = unicodedata.normalize('NFKD', str(s).casefold())
+    s = ''.join(c for c in s if not unicodedata.combining(c))
+    return ' '.join(unicodedata.normalize('NFC', s).split())
+
+
+def label_words(normalized):
+    return WORD_RE.findall(normalized)
+
+
+def label_trigrams(normalized):
+    """
+    character trigrams of a normalized label, padded with a space at
+    either end so that short labels (e.g., '北宋') still have some
+    """
+    padded = ' {} '.format(normalized)
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class LabelIndex(object):
+    """
+    inverted index from words and character trigrams of normalized labels
+    to the documents (e.g., period definitions) that carry them
+
+    Each document can have several labels. Postings are sorted arrays of
+    label numbers; labels map back to documents through self.docs.
+
+    Parameters
+    ----------
+    entries : iterable of (int, str)
+        (document number, label) pairs
+
+    """
+
+    def __init__(self, entries=()):
+        self.labels = []
+        self.docs = array('I')
+
+        seen = set()
+        for (doc, label) in entries:
+            label = normalize_label(label)
+            if (doc, label) not in seen:
+                seen.add((doc, label))
+                self.labels.append(label)
+                self.docs.append(doc)
+
+        self._build()
+
+    def _build(self):
+        words = defaultdict(set)
+        grams = defaultdict(set)
+        by_label = defaultdict(list)
+        for (i, label) in enumerate(self.labels):
+            by_label[label].append(self.docs[i])
+            for word in label_words(label):
+                words[word].add(i)
+            for gram in label_trigrams(label):
+                grams[gram].add(i)
+
+        self.word_postings = dict([(w, array('I', sorted(ids)))
+                                   for (w, ids) in words.items()])
+        self.gram_postings = dict([(g, array('I', sorted(ids)))
+                                   for (g, ids) in grams.items()])
+        self._by_label = dict(by_label)
+        self._gram_counts = array('I', [len(label_trigrams(label))
+                                        for label in self.labels])
+
+        # sorted (key, label number) lists for prefix search over whole
+        # labels and over single words
+        self._sorted_labels = sorted(
+            (label, i) for (i, label) in enumerate(self.labels))
+        self._sorted_words = sorted(
+            (word, i) for (word, ids) in words.items() for i in ids)
+
+    @classmethod
+    def from_periods(cls, periods):
+        """
+        index the labels and localized labels of a list of Period,
+        with documents numbered by position in the list
+        """
+        return cls((i, label) for (i, period) in enumerate(periods)
+                   for label in period.labels)
+
+    def __repr__(self):
+        return ("""LabelIndex(<{} labels>)""".format(len(self.labels)))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def exact(self, query):
+        """
+        documents with a label equal to query (after normalization)
+        """
+        return list(self._by_label.get(normalize_label(query), []))
+
+    def all_words(self, query):
+        """
+        documents with a label containing every word of query
+        """
+        words = label_words(normalize_label(query))
+        if not len(words):
+            return []
+        postings = sorted((self.word_postings.get(w, ()) for w in words),
+                          key=len)
+        ids = set(postings[0])
+        for p in postings[1:]:
+            ids.intersection_update(p)
+        return sorted(set(self.docs[i] for i in ids))
+
+    def prefix(self, prefix, k=None):
+        """
+        documents with a label, or a word in a label, starting with prefix,
+        in label order
+        """
+        prefix = normalize_label(prefix)
+        found = dict()
+        for sorted_keys in (self._sorted_labels, self._sorted_words):
+            start = bisect.bisect_left(sorted_keys, (prefix,))
+            for (key, i) in sorted_keys[start:]:
+                if not key.startswith(prefix):
+                    break
+                found.setdefault(self.docs[i], self.labels[i])
+
+        docs = sorted(found, key=lambda doc: (found[doc], doc))
+        return docs if k is None else docs[:k]
+
+    def search(self, query, k=10):
+        """
+        the top k (document, score) pairs for query ranked by trigram
+        (Dice) similarity of the best matching label
+        """
+        grams = label_trigrams(normalize_label(query))
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.gram_postings.get(gram, ()))
+
+        best = dict()
+        for (i, n) in shared.items():
+            score = 2 * n / (len(grams) + self._gram_counts[i])
+            doc = self.docs[i]
+            if score > best.get(doc, 0):
+                best[doc] = score
+
+        return heapq.nlargest(k, best.items(), key=lambda x: (x[1], -x[0]))
+
+    def to_dict(self):
+        return {
+            'labels': self.labels,
+            'docs': list(self.docs),
+            'word_postings': dict([(w, list(ids)) for (w, ids)
+                                   in self.word_postings.items()]),
+            'gram_postings': dict([(g, list(ids)) for (g, ids)
+                                   in self.gram_postings.items()]),
+            'gram_counts': list(self._gram_counts)
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        # restore the postings as stored instead of re-tokenizing labels
+        index = cls()
+        index.labels = list(d['labels'])
+        index.docs = array('I', d['docs'])
+        index.word_postings = dict([(w, array('I', ids)) for (w, ids)
+                                    in d['word_postings'].items()])
+        index.gram_postings = dict([(g, array('I', ids)) for (g, ids)
+                                    in d['gram_postings'].items()])
+        index._gram_counts = array('I', d['gram_counts'])
+
+        by_label = defaultdict(list)
+        for (label, doc) in zip(index.labels, index.docs):
+            by_label[label].append(doc)
+        index._by_label = dict(by_label)
+        index._sorted_labels = sorted(
+            (label, i) for (i, label) in enumerate(index.labels))
+        index._sorted_words = sorted(
+            (word, i) for (word, ids) in index.word_postings.items()
+            for i in ids)
+        return index
+
+    def dump(self, fp):
+        json.dump(self.to_dict(), fp, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, fp):
+        return cls.from_dict(json.load(fp))
+
+
+def bitmap_from_docs(docs):
+    """
+    a set of document numbers as an int with those bits set
+    """
+    bitmap = 0
+    for doc in docs:
+        bitmap |= 1 << doc
+    return bitmap
+
+
+def docs_from_bitmap(bitmap):
+    """
+    the document numbers set in bitmap, in increasing order
+    """
+    docs = []
+    while bitmap:
+        low = bitmap & -bitmap
+        docs.append(low.bit_length() - 1)
+        bitmap ^= low
+    return docs
+
+
+def _place_id_keys(place_id):
+    # a place id such as http://dbpedia.org/resource/Cyprus or
+    # http://www.wikidata.org/entity/Q229 is looked up by the full id and
+    # by its last path segment ('Cyprus', 'Q229')
+    keys = [place_id.strip()]
+    tail = place_id.rstrip('/').rsplit('/', 1)[-1]
+    if tail and tail != place_id:
+        keys.append(normalize_label(tail.replace('_', ' ')))
+    return keys
+
+
+class SpatialIndex(object):
+    """
+    index from normalized place labels and place ids (e.g., DBpedia or
+    Wikidata URIs) to the documents (e.g., period definitions) whose
+    spatial coverage includes them
+
+    Sets of documents are int bitmaps (bit i set for document i), so
+    they can be intersected with &, e.g., with
+    bitmap_from_docs(label_index.exact(query)).
+
+    Parameters
+    ----------
+    entries : iterable of (int, iterable of (str, str), str)
+        (document number, (place id, place label) pairs, description)
+    max_lookups : int
+        number of distinct locations whose lookups are remembered
+
+    """
+
+    def __init__(self, entries=(), max_lookups=4096):
+        self.bitmaps = defaultdict(int)
+        for (doc, places, description) in entries:
+            bit = 1 << doc
+            for (place_id, label) in places:
+                if place_id:
+                    for key in _place_id_keys(place_id):
+                        self.bitmaps[key] |= bit
+                if label:
+                    self.bitmaps[normalize_label(label)] |= bit
+            if description:
+                self.bitmaps[normalize_label(description)] |= bit
+        self.bitmaps = dict(self.bitmaps)
+
+        # the keys normalized (place ids are kept as given in
+        # self.bitmaps), for matching locations within them
+        folded = defaultdict(int)
+        for (key, bitmap) in self.bitmaps.items():
+            folded[normalize_label(key)] |= bitmap
+        self._folded = list(folded.items())
+
+        self.max_lookups = max_lookups
+        self._lookups = dict()
+
+    @classmethod
+    def from_periods(cls, periods):
+        return cls((i, period.spatial_coverage,
+                    period.spatial_coverage_description)
+                   for (i, period) in enumerate(periods))
+
+    def __repr__(self):
+        return ("""SpatialIndex(<{} places>)""".format(len(self.bitmaps)))
+
+    def __len__(self):
+        return len(self.bitmaps)
+
+    def lookup(self, location):
+        """
+        bitmap of the documents covering location: a place id, or a
+        place label, place id or description that location is part of
+        once both are normalized (e.g., 'cyprus' matches both 'cyprus'
+        and 'northern cyprus')
+        """
+        bitmap = self._lookups.get(location)
+        if bitmap is not None:
+            return bitmap
+
+        bitmap = self.bitmaps.get(location.strip(), 0)
+        normalized = normalize_label(location)
+        if normalized:
+            for (key, key_bitmap) in self._folded:
+                if normalized in key:
+                    bitmap |= key_bitmap
+
+        # locations repeat across rows, so remember the answer, for a
+        # bounded number of them
+        if len(self._lookups) >= self.max_lookups:
+            self._lookups.clear()
+        self._lookups[location] = bitmap
+        return bitmap
+
+    def filter(self, docs, location):
+        """
+        the documents in docs covering location, in the order given
+        """
+        bitmap = self.lookup(location)
+        return [doc for doc in docs if (bitmap >> doc) & 1]
+
+
+class _IntervalNode(object):
+    __slots__ = ('center', 'by_start', 'by_stop', 'left', 'right')
+
+    def __init__(self, center, by_start, by_stop, left, right):
+        self.center = center
+        self.by_start = by_start
+        self.by_stop = by_stop
+        self.left = left
+        self.right = right
+
+
+class IntervalIndex(object):
+    """
+    centered interval tree over the (start, stop) years of documents
+    (e.g., period definitions), answering overlap and containment queries
+    in O(log n + k)
+
+    Documents with no start year are taken to start at -infinity, and
+    documents with no stop year to stop at +infinity.
+
+    Parameters
+    ----------
+    entries : iterable of (int, int or None, int or None)
+        (document number, start, stop) triples
+
+    """
+
+    def __init__(self, entries=(), id_to_doc=None):
+        # maps reconciler result ids to document numbers, for rerank
+        self.id_to_doc = id_to_doc if id_to_doc is not None else dict()
+
+        self.intervals = dict()
+        for (doc, start, stop) in entries:
+            start = -math.inf if start is None else start
+            stop = math.inf if stop is None else stop
+            if start > stop:
+                (start, stop) = (stop, start)
+            self.intervals[doc] = (start, stop)
+
+        self._root = self._build(
+            [(start, stop, doc)
+             for (doc, (start, stop)) in self.intervals.items()])
+
+    @classmethod
+    def from_periods(cls, periods):
+        return cls(((i, period.start, period.stop)
+                    for (i, period) in enumerate(periods)),
+                   id_to_doc=dict([(period.id, i)
+                                   for (i, period) in enumerate(periods)]))
+
+    def __repr__(self):
+        return ("""IntervalIndex(<{} intervals>)"""
+                .format(len(self.intervals)))
+
+    def __len__(self):
+        return len(self.intervals)
+
+    @classmethod
+    def _build(cls, intervals):
+        if not len(intervals):
+            return None
+
+        # center on the median endpoint, ignoring infinite ones
+        endpoints = sorted(x for (start, stop, doc) in intervals
+                           for x in (start, stop) if math.isfinite(x))
+        center = endpoints[len(endpoints) // 2] if len(endpoints) else 0
+
+        here = [i for i in intervals if i[0] <= center <= i[1]]
+        left = [i for i in intervals if i[1] < center]
+        right = [i for i in intervals if i[0] > center]
+
+        return _IntervalNode(
+            center,
+            sorted(here, key=lambda i: i[0]),
+            sorted(here, key=lambda i: -i[1]),
+            cls._build(left), cls._build(right))
+
+    def overlapping(self, start=None, stop=None):
+        """
+        documents whose interval overlaps [start, stop], sorted
+        """
+        start = -math.inf if start is None else start
+        stop = math.inf if stop is None else stop
+
+        found = []
+        nodes = [self._root]
+        while len(nodes):
+            node = nodes.pop()
+            if node is None:
+                continue
+            if stop < node.center:
+                # everything here stops at or after center > stop, so
+                # it overlaps if it starts by stop
+                for (s, e, doc) in node.by_start:
+                    if s > stop:
+                        break
+                    found.append(doc)
+                nodes.append(node.left)
+            elif start > node.center:
+                for (s, e, doc) in node.by_stop:
+                    if e < start:
+                        break
+                    found.append(doc)
+                nodes.append(node.right)
+            else:
+                found.extend(doc for (s, e, doc) in node.by_start)
+                nodes.append(node.left)
+                nodes.append(node.right)
+
+        return sorted(found)
+
+    def containing(self, start=None, stop=None):
+        """
+        documents whose interval contains all of [start, stop]
+        """
+        start = -math.inf if start is None else start
+        stop = math.inf if stop is None else stop
+        return [doc for doc in self.overlapping(start, stop)
+                if self.intervals[doc][0] <= start and
+                self.intervals[doc][1] >= stop]
+
+    def within(self, start=None, stop=None):
+        """
+        documents whose interval lies inside [start, stop]
+        """
+        start = -math.inf if start is None else start
+        stop = math.inf if stop is None else stop
+        return [doc for doc in self.overlapping(start, stop)
+                if self.intervals[doc][0] >= start and
+                self.intervals[doc][1] <= stop]
+
+    def fit(self, doc, start=None, stop=None):
+        """
+        how well doc's interval fits [start, stop]: the length of their
+        intersection over the length of their union (1 for identical
+        intervals, 0 for disjoint ones), or None if either is unbounded
+        """
+        (s, e) = self.intervals[doc]
+        if start is None or stop is None:
+            return None
+        if start > stop:
+            (start, stop) = (stop, start)
+        union = max(e, stop) - min(s, start)
+        if not math.isfinite(union):
+            return None
+        if union == 0:
+            return 1.0
+        return max(0, min(e, stop) - max(s, start)) / union
+
+    def rerank(self, results, start=None, stop=None):
+        """
+        drop reconciler results that don't overlap [start, stop] and order
+        the rest by fit, best first (a stable sort, so the reconciler's
+        order breaks ties); results with ids not in self.id_to_doc are
+        kept at the end
+        """
+        overlapping = set(self.overlapping(start, stop))
+        known = []
+        unknown = []
+        for result in results:
+            doc = self.id_to_doc.get(result['id'])
+            if doc is None:
+                unknown.append(result)
+            elif doc in overlapping:
+                known.append((self.fit(doc, start, stop) or 0, result))
+        known.sort(key=lambda x: -x[0])
+        return [result for (fit, result) in known] + unknown
+
+    def fit_columns(self, docs, starts, stops):
+        """
+        fit of each document in docs to the (start, stop) pair in the same
+        position of starts and stops, e.g., the match_id and start/stop
+        columns of a CSV; each distinct triple is only computed once
+
+        docs are document numbers or ids, which are mapped through
+        self.id_to_doc; the fit is None for an unknown or empty id (as
+        the match_id of an unmatched row) and for a document without
+        an interval
+        """
+        fits = dict()
+        results = []
+        for key in zip(docs, starts, stops):
+            if key not in fits:
+                (doc, start, stop) = key
+                if isinstance(doc, str):
+                    doc = self.id_to_doc.get(doc)
+                fits[key] = (None if doc is None or doc not in self.intervals
+                             else self.fit(doc, _year_or_none(start),
+                                           _year_or_none(stop)))
+            results.append(fits[key])
+        return results
+
+
+def _year_or_none(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+
+__all__ = ['Instrumentation', 'NullInstrumentation']
+
+
+class Instrumentation(object):
+    """
+    per-stage timers and counters for a reconciliation run
+
+    PeriodoReconciler and CsvReconciler time their stages (csv_parse,
+    query_build, serialize, http, reconcile, matches, fallback, to_csv)
+    and count events (rows, requests_sent, bytes_sent, bytes_received,
+    retries, lru_lookups, lru_misses, cache_hits, cache_misses,
+    errors_cached).
+
+    Parameters
+    ----------
+    hooks : list of callables, optional
+        each is called as hook(kind, name, value) for every measurement,
+        where kind is 'time' (value in seconds) or 'count'
+
+    """
+
+    def __init__(self, hooks=None):
+        self.seconds = defaultdict(float)
+        self.calls = Counter()
+        self.counters = Counter()
+        self.hooks = list(hooks or [])
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return ("""Instrumentation(<{} stages, {} counters>)"""
+                .format(len(self.seconds), len(self.counters)))
+
+    @contextmanager
+    def timer(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - t0)
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] += seconds
+            self.calls[stage] += 1
+        for hook in self.hooks:
+            hook('time', stage, seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+        for hook in self.hooks:
+            hook('count', name, n)
+
+    def merge(self, seconds, calls, counters):
+        """
+        add in the timings and counts of another Instrumentation, such
+        as one from a worker process, given as its seconds, calls and
+        counters
+        """
+        with self._lock:
+            for (stage, t) in seconds.items():
+                self.seconds[stage] += t
+            self.calls.update(calls)
+            self.counters.update(counters)
+
+    def summary(self):
+        counters = dict(self.counters)
+        if 'lru_lookups' in counters:
+            counters['lru_hits'] = (counters['lru_lookups'] -
+                                    counters.get('lru_misses', 0))
+        return {
+            'stages': dict([
+                (stage, {'seconds': round(seconds, 6),
+                         'calls': self.calls[stage]})
+                for (stage, seconds) in sorted(self.seconds.items(),
+                                               key=lambda x: -x[1])]),
+            'counters': counters
+        }
+
+    def report(self, fp):
+        json.dump(self.summary(), fp, indent=2)
+        fp.write('\n')
+
+
+class NullInstrumentation(Instrumentation):
+    """
+    the default: measures nothing
+    """
+
+    def timer(self, stage):
+        return nullcontext()
+
+    def add_time(self, stage, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def merge(self, seconds, calls, counters):
+        pass
@@ -0,0 +1,197 @@
+import hashlib
+import html
+import json
+from collections import OrderedDict
+
+from .dataset import read_periods, periods_from_dataset
+from .index import (LabelIndex, IntervalIndex, SpatialIndex,
+                    normalize_label, label_words)
+
+__all__ = ['LocalPeriodoReconciler', 'period_name']
+
+PERIOD_TYPE = {'id': 'http://www.w3.org/2004/02/skos/core#Concept',
+               'name': 'Period definition'}
+
+
+def _format_year(year):
+    if year is None:
+        return '?'
+    if year < 0:
+        return '-{:04d}'.format(-year)
+    return '{:04d}'.format(year)
+
+
+def period_name(period):
+    """
+    the display name the reconciliation service gives a period, e.g.,
+    'Northern Song [China, China: 0960 to 1127]'
+    """
+    places = ', '.join(
+        [period.spatial_coverage_description] +
+        [label for (id_, label) in period.spatial_coverage])
+    return '{} [{}: {} to {}]'.format(period.label.strip(), places,
+                                      _format_year(period.start),
+                                      _format_year(period.stop))
+
+
+def _int_or_none(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class LocalPeriodoReconciler(object):
+    """
+    answers the same calls as PeriodoReconciler from a PeriodO dataset
+    held in memory, without a reconciliation service
+
+    A query matches periods with a label (or localized label) equal to it
+    after case, diacritic and whitespace folding; failing that, periods
+    whose labels contain all of its words are returned as candidates.
+    Only a single exact candidate is flagged as a match. The location
+    property keeps periods whose spatial coverage mentions it, within a
+    place label, place id or description; start and stop keep periods
+    that overlap the given years.
+    """
+
+    def __init__(self, periods, label_index=None):
+        self.periods = list(periods)
+
+        # pass in a LabelIndex loaded from disk to skip building one
+        if label_index is None:
+            label_index = LabelIndex.from_periods(self.periods)
+        self.label_index = label_index
+        self.interval_index = IntervalIndex.from_periods(self.periods)
+        self.spatial_index = SpatialIndex.from_periods(self.periods)
+
+        self._by_id = dict([(period.id, i)
+                            for (i, period) in enumerate(self.periods)])
+
+        # the dataset file the periods were read from, if any
+        self.path = None
+        self._dataset_version = None
+
+    @classmethod
+    def from_file(cls, path):
+        l_recon = cls(read_periods(path))
+        l_recon.path = path
+        return l_recon
+
+    @property
+    def dataset_version(self):
+        """
+        a digest of the periods, which changes with any part of them
+        used for reconciliation
+        """
+        if self._dataset_version is None:
+            self._dataset_version = 'sha256:' + hashlib.sha256(
+                json.dumps(self.periods).encode('utf-8')).hexdigest()
+        return self._dataset_version
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        return cls(periods_from_dataset(dataset))
+
+    def __repr__(self):
+        return ("""LocalPeriodoReconciler(<{} periods>)"""
+                .format(len(self.periods)))
+
+    def describe(self):
+        return {
+            'name': 'PeriodO (local)',
+            'identifierSpace': 'http://n2t.net/ark:/99152/',
+            'schemaSpace': 'http://www.w3.org/2004/02/skos/core#',
+            'defaultTypes': [PERIOD_TYPE],
+            'view': {'url': '{{id}}'},
+            'preview': {'url': '/preview?id={{id}}',
+                        'width': 400, 'height': 300},
+            'suggest': {'entity': {'service_url': '/',
+                                   'service_path': '/suggest/entities',
+                                   'flyout_service_path':
+                                   '/preview?flyout=true&id=${id}'},
+                        'property': {'service_url': '/',
+                                     'service_path': '/suggest/properties'}}
+        }
+
+    def _result(self, i, score=0, match=False):
+        period = self.periods[i]
+        return {'id': period.id, 'name': period_name(period),
+                'score': score, 'match': match, 'type': [PERIOD_TYPE]}
+
+    def _label_candidates(self, query):
+        """
+        return (period index, score, exact) for the periods whose labels
+        match query
+        """
+        exact = self.label_index.exact(query)
+        if exact:
+            return [(i, 1.0, True) for i in exact]
+
+        # score partial matches by the share of the label's words matched
+        n = len(label_words(normalize_label(query)))
+        return [(i, n / max(len(label_words(normalize_label(label)))
+                            for label in self.periods[i].labels), False)
+                for i in self.label_index.all_words(query)]
+
+    def _filter_properties(self, candidates, properties):
+        props = dict([(p['p'], p['v']) for p in properties])
+
+        location = props.get('location')
+        if location is not None and normalize_label(location):
+            covering = self.spatial_index.lookup(str(location))
+            candidates = [c for c in candidates if (covering >> c[0]) & 1]
+
+        start = _int_or_none(props.get('start'))
+        stop = _int_or_none(props.get('stop', props.get('end')))
+        if start is not None or stop is not None:
+            overlapping = set(self.interval_index.overlapping(start, stop))
+            candidates = [c for c in candidates if c[0] in overlapping]
+
+        return candidates
+
+    def _reconcile_one(self, v):
+        candidates = self._label_candidates(v.get('query', ''))
+        candidates = self._filter_properties(candidates,
+                                             v.get('properties', []))
+        candidates.sort(key=lambda c: (not c[2], -c[1],
+                                       self.periods[c[0]].label))
+
+        exact_count = sum(1 for c in candidates if c[2])
+        results = [self._result(i, score, exact and exact_count == 1)
+                   for (i, score, exact) in candidates]
+
+        if v.get('limit') is not None:
+            results = results[:v['limit']]
+        return {'result': results}
+
+    def reconcile_dict(self, queries_dict):
+        """
+        reconcile queries in the service's JSON form (label -> query)
+        """
+        return dict([(k, self._reconcile_one(v))
+                     for (k, v) in queries_dict.items()])
+
+    def reconcile(self, queries, method='GET', query_by_query=False):
+        return self.reconcile_dict(
+            OrderedDict([q.to_key_value() for q in queries]))
+
+    def suggest_properties(self):
+        return [{'id': 'location', 'name': 'Location'},
+                {'id': 'start', 'name': 'Start year'},
+                {'id': 'stop', 'name': 'Stop year'}]
+
+    def suggest_entities(self, prefix):
+        return [self._result(i) for i in self.label_index.prefix(prefix)]
+
+    def preview_period(self, period_id, flyout=False):
+        period = self.periods[self._by_id[period_id]]
+        body = ('<div><a href="{0}">{1}</a></div>'
+                .format(html.escape(period.id),
+                        html.escape(period_name(period))))
+        if flyout:
+            return json.dumps({'id': period.id,
+                               'html': body}).encode('utf-8')
+        return ('<!doctype html><html><head><meta charset="utf-8">'
+                '<title>{}</title></head><body>{}</body></html>'
+                .format(html.escape(period.label), body)).encode('utf-8')
@@ -0,0 +1,89 @@
+import re
+
+__all__ = ['QueryFilter', 'fold_query']
+
+
+def fold_query(q):
+    """
+    fold case and whitespace: ' Not  Determined' -> 'not determined'
+    """
+    return ' '.join(q.split()).casefold()
+
+
+class QueryFilter(object):
+    """
+    decides which queries are not worth sending to the reconciler: empty
+    ones, those on an ignore list and those matching a regex rule, all
+    compared after fold_query
+
+    CsvReconciler gives the rows it skips an empty result without any
+    network I/O, and counts them by reason in its skip_counts.
+
+    Parameters
+    ----------
+    ignored : iterable of str
+        queries to skip
+    patterns : iterable of str or compiled regex
+        skip queries that re.fullmatch any of these; str patterns are
+        compiled with re.IGNORECASE
+    skip_empty : bool
+        skip queries that are empty or all whitespace
+
+    """
+
+    def __init__(self, ignored=(), patterns=(), skip_empty=True):
+        self.ignored = frozenset(fold_query(q) for q in ignored)
+        self.patterns = [re.compile(p, re.IGNORECASE)
+                         if isinstance(p, str) else p
+                         for p in patterns]
+        self.skip_empty = skip_empty
+
+        # the reason (or None) for each query seen, as a column of a
+        # large CSV repeats the same few values
+        self._reasons = dict()
+
+    def __repr__(self):
+        return ("""QueryFilter(<{} ignored, {} patterns>, skip_empty={})"""
+                .format(len(self.ignored), len(self.patterns),
+                        self.skip_empty))
+
+    @classmethod
+    def from_file(cls, path, patterns=(), skip_empty=True):
+        """
+        read the ignore list from path: one query per line, skipping
+        blank lines and lines starting with #
+        """
+        with open(path, encoding='utf-8') as f:
+            ignored = [line.strip() for line in f
+                       if line.strip() and not line.startswith('#')]
+        return cls(ignored, patterns=patterns, skip_empty=skip_empty)
+
+    def describe(self):
+        """
+        a JSON-able description of the filter, for checkpoint fingerprints
+        """
+        return {'ignored': sorted(self.ignored),
+                'patterns': [p.pattern for p in self.patterns],
+                'skip_empty': self.skip_empty}
+
+    def _reason(self, query):
+        # a short CSV row has None for its missing query
+        folded = fold_query(query or '')
+        if not folded:
+            return 'empty' if self.skip_empty else None
+        if folded in self.ignored:
+            return 'ignored'
+        if any(p.fullmatch(folded) for p in self.patterns):
+            return 'pattern'
+        return None
+
+    def reason(self, query):
+        """
+        why query is to be skipped ('empty', 'ignored' or 'pattern'), or
+        None if it is to be sent; a None query counts as empty
+        """
+        try:
+            return self._reasons[query]
+        except KeyError:
+            reason = self._reasons[query] = self._reason(query)
+            return reason
@@ -0,0 +1,166 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+__all__ = ['PreviewStore', 'StoredPreview']
+
+# what PreviewStore.get returns: the preview body, the validators the
+# service sent with it (or None) and whether it is still within max_age
+StoredPreview = namedtuple('StoredPreview', ['body', 'etag',
+                                             'last_modified', 'fresh'])
+
+
+class PreviewStore(object):
+    """
+    on-disk store of /preview bodies for PeriodoReconciler.preview_period,
+    backed by SQLite
+
+    Bodies are kept gzipped (when that makes them smaller) under the
+    SHA-256 of their content, so that a body is stored once however many
+    periods share it or however often it is fetched again. Each (period
+    id, flyout) maps to its body and to the ETag and Last-Modified
+    headers it came with; once older than max_age, a preview is
+    revalidated with a conditional request.
+
+    Like SqliteCache, a store can be shared by threads and processes.
+    Bodies no preview refers to any more are pruned every
+    prune_interval calls to set.
+
+
+    Parameters
+    ----------
+    path : str
+        path of the SQLite database file
+    max_age : float, optional
+        seconds for which a stored preview is used without asking the
+        service; None to use it for good
+    compresslevel : int
+        gzip level of the stored bodies
+    timeout : float
+        seconds to wait for a lock on the database
+    prune_interval : int
+        how many calls to set between calls to prune
+
+    """
+
+    def __init__(self, path, max_age=None, compresslevel=6, timeout=30.0,
+                 prune_interval=256):
+        self.path = path
+        self.max_age = max_age
+        self.compresslevel = compresslevel
+        self.timeout = timeout
+        self.prune_interval = prune_interval
+
+        self._local = threading.local()
+        self._writes = 0
+
+        conn = self._conn()
+        with conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS objects
+                            (digest TEXT PRIMARY KEY, body BLOB NOT NULL,
+                             gzipped INTEGER NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS previews
+                            (id TEXT NOT NULL, flyout INTEGER NOT NULL,
+                             digest TEXT NOT NULL, etag TEXT,
+                             last_modified TEXT, fetched REAL NOT NULL,
+                             PRIMARY KEY (id, flyout))""")
+
+    def __repr__(self):
+        return ("""PreviewStore({}, max_age={})"""
+                .format(json.dumps(self.path), json.dumps(self.max_age)))
+
+    def _conn(self):
+        # one connection per thread and per process, as for SqliteCache
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, period_id, flyout=False):
+        """
+        the StoredPreview of period_id, or None if there isn't one
+        """
+        row = self._conn().execute(
+            """SELECT body, gzipped, etag, last_modified, fetched
+               FROM previews JOIN objects USING (digest)
+               WHERE id = ? AND flyout = ?""",
+            (period_id, int(flyout))).fetchone()
+        if row is None:
+            return None
+
+        (body, gzipped, etag, last_modified, fetched) = row
+        if gzipped:
+            body = gzip.decompress(body)
+        fresh = self.max_age is None or time.time() - fetched < self.max_age
+        return StoredPreview(bytes(body), etag, last_modified, fresh)
+
+    def set(self, period_id, flyout, body, etag=None, last_modified=None):
+        """
+        store body as the preview of period_id, with its validators
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        compressed = gzip.compress(body, self.compresslevel)
+        gzipped = len(compressed) < len(body)
+
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                """INSERT OR IGNORE INTO objects (digest, body, gzipped)
+                   VALUES (?, ?, ?)""",
+                (digest, compressed if gzipped else body, int(gzipped)))
+            conn.execute(
+                """INSERT OR REPLACE INTO previews
+                   (id, flyout, digest, etag, last_modified, fetched)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (period_id, int(flyout), digest, etag, last_modified,
+                 time.time()))
+
+        self._writes += 1
+        if self._writes % self.prune_interval == 0:
+            self.prune()
+
+    def touch(self, period_id, flyout=False):
+        """
+        mark the preview of period_id as fresh, as after the service
+        answered a revalidation with 304 Not Modified
+        """
+        self._conn().execute(
+            'UPDATE previews SET fetched = ? WHERE id = ? AND flyout = ?',
+            (time.time(), period_id, int(flyout)))
+
+    def prune(self):
+        """
+        delete the stored bodies that no preview refers to any more, and
+        return how many there were
+        """
+        return self._conn().execute(
+            """DELETE FROM objects WHERE digest NOT IN
+               (SELECT digest FROM previews)""").rowcount
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM previews')
+            conn.execute('DELETE FROM objects')
+
+    def __len__(self):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM previews').fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
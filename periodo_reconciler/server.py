@@ -0,0 +1,143 @@
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+__all__ = ['make_server', 'serve_in_thread']
+
+# a stand-in for the periodo-reconciler service, answering the same
+# endpoints (/, /suggest/entities, /suggest/properties, /preview) from a
+# LocalPeriodoReconciler, with optional added latency and errors; used
+# by the tests and benchmarks
+
+
+class ReconcilerRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes; without this, Nagle's
+    # algorithm and delayed ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json',
+              headers=()):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for (name, value) in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, params):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.request_count += 1
+            fail = server.rng.random() < server.error_rate
+        if fail:
+            self._send(503, {'error': 'simulated failure'})
+            return
+
+        engine = server.engine
+        path = urllib.parse.urlsplit(self.path).path
+
+        if path == '/':
+            if 'queries' in params:
+                try:
+                    queries_dict = json.loads(params['queries'])
+                except ValueError:
+                    self._send(400, {'error': 'malformed queries'})
+                    return
+                self._send(200, engine.reconcile_dict(queries_dict))
+            else:
+                self._send(200, engine.describe())
+        elif path == '/suggest/entities':
+            self._send(200, {'result': engine.suggest_entities(
+                params.get('prefix', ''))})
+        elif path == '/suggest/properties':
+            self._send(200, {'result': engine.suggest_properties()})
+        elif path == '/preview':
+            flyout = params.get('flyout', '').lower() == 'true'
+            try:
+                body = engine.preview_period(params.get('id'), flyout=flyout)
+            except KeyError:
+                self._send(404, {'error': 'unknown id'})
+                return
+            # previews can be revalidated by their ETag
+            etag = '"{}"'.format(hashlib.sha256(body).hexdigest()[:32])
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, b'', headers=[('ETag', etag)])
+                return
+            self._send(200, body, 'application/json' if flyout
+                       else 'text/html; charset=utf-8',
+                       headers=[('ETag', etag)])
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def do_GET(self):
+        query = urllib.parse.urlsplit(self.path).query
+        self._handle(dict(urllib.parse.parse_qsl(query)))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        params = dict(urllib.parse.parse_qsl(body))
+        query = urllib.parse.urlsplit(self.path).query
+        params.update(urllib.parse.parse_qsl(query))
+        self._handle(params)
+
+
+def make_server(engine, host='localhost', port=0, latency=0.0,
+                error_rate=0.0, seed=None):
+    """
+    return a ThreadingHTTPServer serving the reconciliation API
+
+
+    Parameters
+    ----------
+    engine : LocalPeriodoReconciler
+        answers the requests
+    host, port : str, int
+        address to listen on; port 0 picks a free port
+    latency : float
+        seconds to wait before answering each request
+    error_rate : float
+        fraction of requests answered with a 503
+    seed : int, optional
+        seed for the random choice of failing requests
+
+    Returns
+    -------
+    http.server.ThreadingHTTPServer
+
+    """
+    server = ThreadingHTTPServer((host, port), ReconcilerRequestHandler)
+    server.daemon_threads = True
+    server.engine = engine
+    server.latency = latency
+    server.error_rate = error_rate
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.request_count = 0
+    return server
+
+
+def serve_in_thread(engine, **kwargs):
+    """
+    start make_server(engine, **kwargs) in a daemon thread and return the
+    server; its address is 'localhost:{}'.format(server.server_port)
+    and server.shutdown() stops it
+    """
+    server = make_server(engine, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
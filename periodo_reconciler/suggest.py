@@ -0,0 +1,218 @@
+import threading
+from itertools import compress
+from collections import Counter, OrderedDict
+
+from .dataset import read_periods
+from .index import normalize_label, label_words
+
+__all__ = ['SuggestCache']
+
+
+def _match(labels, words, prefix):
+    """
+    how LabelIndex.prefix finds a document among the results for prefix:
+    (matched, label), where matched is the document's first whole label
+    starting with prefix, or else its first word starting with prefix,
+    and label is the label the document is then ordered by; None if the
+    document isn't a result
+
+    labels are the document's normalized labels, in order, and words
+    the sorted (word, label position) pairs of their words
+
+    A longer prefix that matched still starts with finds the document
+    the same way.
+    """
+    whole = [label for label in labels if label.startswith(prefix)]
+    if len(whole):
+        label = min(whole)
+        return (label, label)
+    for (word, j) in words:
+        if word.startswith(prefix):
+            return (word, labels[j])
+    return None
+
+
+class SuggestCache(object):
+    """
+    client-side LRU cache of suggest_entities results by prefix, for
+    autocompletion
+
+    Prefixes are normalized as the service normalizes them, so 'Roman'
+    and ' roman' share an entry. Given the labels of the periods (from
+    the same PeriodO dataset as the service's), a prefix that extends
+    one already cached is answered by narrowing the shorter prefix's
+    results to those with a label, or a word of a label, starting with
+    it, ordered as the service orders them -- without a request. That
+    order is LabelIndex.prefix's, and narrowing has only been checked
+    against the stand-in service of periodo_reconciler.server; for a
+    service that orders its results otherwise, give no periods.
+
+    PeriodoReconciler and AsyncPeriodoReconciler take one as their
+    suggest_cache.
+
+
+    Parameters
+    ----------
+    periods : list of Period, optional
+        the periods of the dataset, in order; without them, only
+        prefixes already fetched are answered
+    max_entries : int
+        keep at most this many prefixes, evicting the least recently
+        used
+    limit : int, optional
+        the most results the service returns for a prefix; results that
+        long may have been cut short, so they are not narrowed. None
+        assumes that the service never cuts its results short.
+
+    Attributes
+    ----------
+    stats : Counter
+        hits, narrowed (answered from a shorter prefix), misses and
+        evictions
+
+    """
+
+    def __init__(self, periods=None, max_entries=1024, limit=None):
+        self.max_entries = max_entries
+        self.limit = limit
+        self.stats = Counter()
+
+        # id -> (position in the dataset, normalized labels, sorted
+        # (word, label position) pairs)
+        self._labels = None
+        if periods is not None:
+            self._labels = dict()
+            for (i, period) in enumerate(periods):
+                labels = []
+                for label in period.labels:
+                    label = normalize_label(label)
+                    if label not in labels:
+                        labels.append(label)
+                words = sorted(set((word, j) for (j, label)
+                                   in enumerate(labels)
+                                   for word in label_words(label)))
+                self._labels[period.id] = (i, labels, words)
+
+        # normalized prefix -> (results, their _match or None until
+        # needed), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, **kw):
+        """
+        a SuggestCache narrowing by the periods of the PeriodO dataset
+        at path
+        """
+        return cls(periods=read_periods(path), **kw)
+
+    def __repr__(self):
+        return ("""SuggestCache(max_entries={}, <{} entries>)"""
+                .format(self.max_entries, len(self)))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _complete(self, results):
+        return self.limit is None or len(results) < self.limit
+
+    def _matches(self, key):
+        """
+        the _match of each result for key, as (matched, (label, position
+        in the dataset)) lists, worked out on first use; None if a
+        result's labels are unknown or don't match key (results stored
+        under the wrong prefix)
+        """
+        (results, matches) = self._entries[key]
+        if matches is None:
+            matched = []
+            order = []
+            for result in results:
+                labels = self._labels.get(result['id'])
+                if labels is None:
+                    return None
+                (i, labels, words) = labels
+                match = _match(labels, words, key)
+                if match is None:
+                    return None
+                (m, label) = match
+                matched.append(m)
+                order.append((label, i))
+            matches = (matched, order)
+            self._entries[key] = (results, matches)
+        return matches
+
+    def _narrow(self, shorter, key):
+        """
+        the entry for key made from that of the shorter prefix: its
+        results for key, in the service's order, with their matches;
+        None if they can't be told
+        """
+        matches = self._matches(shorter)
+        if matches is None:
+            return None
+        results = self._entries[shorter][0]
+        (matched, order) = matches
+
+        # the results still matched the same way keep their place
+        same = [m.startswith(key) for m in matched]
+        entry = [list(compress(results, same)),
+                 (list(compress(matched, same)), list(compress(order, same)))]
+
+        # the others may match by another label or word
+        rematched = []
+        for result in compress(results, [not s for s in same]):
+            (i, labels, words) = self._labels[result['id']]
+            match = _match(labels, words, key)
+            if match is not None:
+                rematched.append((result, match[0], (match[1], i)))
+        if len(rematched):
+            merged = sorted(
+                list(zip(entry[0], *entry[1])) + rematched,
+                key=lambda r: r[2])
+            entry = [[r[0] for r in merged],
+                     ([r[1] for r in merged], [r[2] for r in merged])]
+        return tuple(entry)
+
+    def get(self, prefix):
+        """
+        the results for prefix, as a new list, or None if they have to
+        be fetched
+        """
+        key = normalize_label(prefix)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return list(entry[0])
+
+            if self._labels is not None:
+                # the longest cached prefix of key with all its results
+                for n in range(len(key) - 1, -1, -1):
+                    shorter = self._entries.get(key[:n])
+                    if shorter is None or not self._complete(shorter[0]):
+                        continue
+                    entry = self._narrow(key[:n], key)
+                    if entry is not None:
+                        self.stats['narrowed'] += 1
+                        self._set(key, entry)
+                        return list(entry[0])
+
+            self.stats['misses'] += 1
+            return None
+
+    def _set(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def set(self, prefix, results):
+        with self._lock:
+            self._set(normalize_label(prefix), (list(results), None))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
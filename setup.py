@@ -26,8 +26,16 @@ Open Refine reconciliation service for PeriodO data""",
       packages=find_packages(exclude=['ez_setup', 'examples', 'tests']),
       include_package_data=True,
       zip_safe=False,
+      # contextlib.nullcontext and http.server.ThreadingHTTPServer
+      python_requires='>=3.7',
       install_requires=requirements,
       extras_require={
+          'async': [
+              'aiohttp'
+          ],
+          'frame': [
+              'pandas'
+          ],
           'dev': [
               'pytest',
               'pytest-pep8',
@@ -38,7 +46,7 @@ Open Refine reconciliation service for PeriodO data""",
               'pandas'
           ]
       },
-      scripts=['bin/periodo-reconciler-py'],
+      scripts=['bin/periodo-reconciler-py', 'bin/periodo-reconciler-batch'],
       entry_points="""
       # -*- Entry points: -*-
       """,
@@ -10,3 +10,30 @@ from periodo_reconciler import (
 @pytest.fixture
 def p_recon():
     return PeriodoReconciler(host='localhost:8142')
+
+
+class FakeReconciler(object):
+    """
+    stands in for PeriodoReconciler without a running service: each query
+    matches a single made-up period named after the query
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def reconcile(self, queries, method='GET', query_by_query=False):
+        self.queries.extend(queries)
+        return dict([
+            (q.label, {'result': [{
+                'id': 'http://example.org/' + q.query,
+                'name': q.query.title(),
+                'match': True,
+                'score': 0,
+                'type': []}] if q.query else []})
+            for q in queries
+        ])
+
+
+@pytest.fixture
+def fake_recon():
+    return FakeReconciler()
@@ -0,0 +1,116 @@
+import asyncio
+import io
+import pytest
+from periodo_reconciler import (
+    RQuery,
+    PeriodoReconciler,
+    LocalPeriodoReconciler,
+    CsvReconciler,
+    Instrumentation,
+    PreviewStore
+)
+from periodo_reconciler.server import serve_in_thread
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from periodo_reconciler.aio import AsyncPeriodoReconciler  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = serve_in_thread(
+        LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld'),
+        latency=0.02)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def host(server):
+    return 'localhost:{}'.format(server.server_port)
+
+
+def test_reconcile(server, host):
+    queries = [RQuery(q, label=str(i)) for (i, q) in
+               enumerate(['Late Roman', 'Hellenistic', 'Late Roman'] * 4)]
+
+    async def run():
+        async with AsyncPeriodoReconciler(host, concurrency=4) as a_recon:
+            count = server.request_count
+            by_query = await a_recon.reconcile(queries,
+                                               query_by_query=True)
+            # identical queries in flight together are sent once
+            assert server.request_count - count == 2
+            at_once = await a_recon.reconcile(queries, method='POST')
+            suggested = await a_recon.suggest_entities('late r')
+            ids = [r['id'] for r in suggested]
+            previews = await a_recon.preview_periods(ids + ids)
+            return (by_query, at_once, suggested, previews)
+
+    (by_query, at_once, suggested, previews) = asyncio.run(run())
+
+    p_recon = PeriodoReconciler(host)
+    expected = p_recon.reconcile(queries)
+    assert by_query == expected
+    assert at_once == expected
+    assert len(suggested)
+    assert previews == p_recon.preview_periods(list(previews))
+
+
+def test_preview_store(server, host, tmp_path):
+    p_recon = PeriodoReconciler(host)
+    ids = [r['id'] for r in p_recon.suggest_entities('roman')]
+    expected = p_recon.preview_periods(ids)
+    store = PreviewStore(str(tmp_path / 'previews.sqlite'), max_age=3600)
+    instrumentation = Instrumentation()
+
+    async def run():
+        async with AsyncPeriodoReconciler(
+                host, preview_store=store,
+                instrumentation=instrumentation) as a_recon:
+            previews = [await a_recon.preview_periods(ids)]
+            previews.append(await a_recon.preview_periods(ids))
+            # once stale, previews are revalidated
+            store.max_age = 0
+            previews.append(await a_recon.preview_periods(ids))
+            return previews
+
+    assert asyncio.run(run()) == [expected] * 3
+    assert instrumentation.counters['requests_sent'] == 2 * len(ids)
+    assert instrumentation.counters['previews_stored'] == len(ids)
+    assert instrumentation.counters['previews_revalidated'] == len(ids)
+
+
+def test_cached_error_raised_again(server, host):
+
+    async def run():
+        errors = []
+        async with AsyncPeriodoReconciler(host + '/missing') as a_recon:
+            for i in range(2):
+                with pytest.raises(aiohttp.ClientResponseError) as e:
+                    await a_recon.reconcile([RQuery('Roman')],
+                                            query_by_query=True)
+                errors.append(e.value)
+        return errors
+
+    count = server.request_count
+    errors = asyncio.run(run())
+    assert server.request_count - count == 1
+    assert errors[1].status == 404
+    assert str(errors[1]) == str(errors[0])
+
+
+def test_aresults_with_rows(host):
+    data = "query,location\n" + "Late Roman,Cyprus\nRoman,Ukraine\n" * 5
+
+    async def run():
+        async with AsyncPeriodoReconciler(host) as a_recon:
+            c_recon = CsvReconciler(io.StringIO(data), a_recon,
+                                    'query', 'location', page_size=3)
+            return [pair async for pair in c_recon.aresults_with_rows()]
+
+    pairs = asyncio.run(run())
+
+    c_recon = CsvReconciler(io.StringIO(data), PeriodoReconciler(host),
+                            'query', 'location', page_size=3)
+    assert pairs == list(c_recon.results_with_rows())
@@ -143,3 +143,102 @@ def test_repr_RQuery():
 def test_RQuery_none_label():
     q = RQuery("bronze age")
     assert q.label is not None
+    assert q.label != RQuery("bronze age").label
+
+
+def test_slots():
+    q = RQuery("bronze age", properties=[RProperty('location', 'Ukraine')])
+    assert not hasattr(q, '__dict__')
+    assert not hasattr(q.properties[0], '__dict__')
+
+
+def test_query_key():
+    q = RQuery("bronze age", label='a', limit=2,
+               properties=[RProperty('location', 'Ukraine')])
+    r = RQuery("bronze age", label='b', limit=2,
+               properties=[RProperty('location', 'Ukraine')])
+
+    assert q.key == r.key
+    assert hash(q.key) == hash(r.key)
+    assert q.key != RQuery("bronze age", limit=2).key
+    # the same JSON, and so the same SqliteCache keys, as before
+    assert q.key.json == json.dumps({'_': q.to_key_value()[1]},
+                                    sort_keys=True)
+
+
+def test_concurrent_query_by_query():
+    import threading
+    import time
+
+    class SlowReconciler(PeriodoReconciler):
+        calls = []
+        lock = threading.Lock()
+
+        def _call_reconciler(self, query_key, method='GET'):
+            query_dict_json = query_key.json
+            with self.lock:
+                self.calls.append(query_dict_json)
+            time.sleep(0.05)
+            query = json.loads(query_dict_json)['_']['query']
+            return {'_': {'result': [{'name': query}]}}
+
+    p_recon = SlowReconciler(host='localhost:1', workers=8)
+    queries = [RQuery(q, label=str(i))
+               for (i, q) in enumerate(['a', 'b', 'a', 'c', 'a', 'b'])]
+    r = p_recon.reconcile(queries, query_by_query=True)
+
+    assert [r[str(i)]['result'][0]['name'] for i in range(6)] == \
+        ['a', 'b', 'a', 'c', 'a', 'b']
+    # identical queries in flight at the same time are only sent once
+    assert sorted(json.loads(c)['_']['query']
+                  for c in SlowReconciler.calls) == ['a', 'b', 'c']
+
+    # every call shares one pool of workers, until close
+    executor = p_recon._executor
+    p_recon.reconcile(queries, query_by_query=True)
+    assert p_recon._executor is executor
+    p_recon.close()
+    assert p_recon._executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(int)
+    # and a closed reconciler makes a new one
+    assert len(p_recon.reconcile(queries, query_by_query=True)) == 6
+    p_recon.close()
+
+
+def test_session_adapter():
+    import requests
+    from requests.adapters import BaseAdapter
+
+    class CannedAdapter(BaseAdapter):
+        def __init__(self):
+            super().__init__()
+            self.urls = []
+
+        def send(self, request, **kwargs):
+            self.urls.append(request.url)
+            r = requests.Response()
+            r.status_code = 200
+            r._content = b'{"result": []}'
+            r.request = request
+            return r
+
+        def close(self):
+            pass
+
+    adapter = CannedAdapter()
+    p_recon = PeriodoReconciler(host='localhost:1', adapter=adapter)
+    assert p_recon.suggest_entities('bronze') == []
+    assert p_recon.suggest_properties() == []
+    assert adapter.urls == [
+        'http://localhost:1/suggest/entities?prefix=bronze',
+        'http://localhost:1/suggest/properties']
+
+
+def test_make_session_retries():
+    from periodo_reconciler import make_session
+
+    adapter = make_session(pool_size=4, max_retries=5).get_adapter(
+        'http://localhost:8142/')
+    assert adapter.max_retries.total == 5
+    assert 503 in adapter.max_retries.status_forcelist
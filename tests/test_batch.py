@@ -0,0 +1,68 @@
+import csv
+import io
+import json
+import pytest
+from periodo_reconciler.batch import (
+    read_manifest,
+    jobs_from_glob,
+    run_batch,
+    _write_atomically
+)
+
+CSV = '''period,place
+Late Roman,Cyprus
+Late Roman,Cyprus
+Hellenistic,Cyprus
+'''
+
+
+def test_read_manifest():
+    jobs = read_manifest(io.StringIO(json.dumps([
+        {'input': 'a.csv', 'output': 'a-out.csv', 'query': 'period'}])))
+    assert jobs[0]['query'] == 'period'
+
+    with pytest.raises(ValueError):
+        read_manifest(io.StringIO(json.dumps([
+            {'input': 'a.csv', 'output': 'a-out.csv', 'query': 'period',
+             'colour': 'red'}])))
+
+
+def test_run_batch(tmp_path):
+    for name in ('a.csv', 'b.csv'):
+        (tmp_path / name).write_text(CSV)
+    (tmp_path / 'out').mkdir()
+
+    jobs = jobs_from_glob(str(tmp_path / '*.csv'), str(tmp_path / 'out'),
+                          query='period', location='place')
+    results = list(run_batch(jobs, processes=2,
+                             dataset='data/p0dg76f.jsonld'))
+
+    assert [job['input'] for (job, _) in results] == [
+        str(tmp_path / 'a.csv'), str(tmp_path / 'b.csv')]
+    for (job, stats) in results:
+        assert stats['rows'] == 3
+        assert stats['queries'] == 2
+        with open(job['output'], newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert len(rows) == 3
+        assert rows[0]['match_id'].startswith('http://n2t.net/ark:')
+
+    # the outputs would overwrite the inputs
+    with pytest.raises(ValueError):
+        jobs_from_glob(str(tmp_path / '*.csv'), str(tmp_path),
+                       query='period')
+
+
+def test_write_atomically(tmp_path):
+    path = str(tmp_path / 'out.csv')
+
+    def fail(f):
+        f.write('partial')
+        raise IOError('disk full')
+
+    with pytest.raises(IOError):
+        _write_atomically(path, fail)
+    assert list(tmp_path.iterdir()) == []
+
+    _write_atomically(path, lambda f: f.write('done'))
+    assert [p.name for p in tmp_path.iterdir()] == ['out.csv']
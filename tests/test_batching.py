@@ -0,0 +1,90 @@
+import requests
+import pytest
+from collections import OrderedDict
+from periodo_reconciler import (
+    RQuery,
+    PeriodoReconciler,
+    LocalPeriodoReconciler,
+    AdaptiveBatcher,
+    make_session
+)
+from periodo_reconciler.batching import timed_out
+from periodo_reconciler.server import serve_in_thread
+
+
+def uri_too_long():
+    r = requests.Response()
+    r.status_code = 414
+    return requests.HTTPError('414', response=r)
+
+
+def test_split_on_414():
+    sent = []
+
+    def send(batch):
+        if len(batch) > 3:
+            raise uri_too_long()
+        sent.append(list(batch))
+        return dict([(k, v['query']) for (k, v) in batch.items()])
+
+    queries = OrderedDict([(str(i), {'query': i}) for i in range(10)])
+    batcher = AdaptiveBatcher(initial_size=8)
+    results = batcher.run(queries, send)
+
+    assert results == dict([(str(i), i) for i in range(10)])
+    assert all(len(batch) <= 3 for batch in sent)
+    assert batcher.splits > 0
+
+
+def test_grows_while_fast():
+    batcher = AdaptiveBatcher(initial_size=2, max_size=16)
+    queries = OrderedDict([(str(i), {'query': i}) for i in range(100)])
+    batcher.run(queries, lambda batch: dict(batch))
+    assert batcher.size == 16
+
+
+def test_max_bytes():
+    sizes = []
+
+    def send(batch):
+        sizes.append(len(batch))
+        return dict(batch)
+
+    queries = OrderedDict([(str(i), {'query': 'x' * 100})
+                           for i in range(20)])
+    AdaptiveBatcher(initial_size=100, max_get_bytes=500).run(queries, send)
+    assert max(sizes) < 5
+    assert sum(sizes) == 20
+
+
+def test_other_errors_raise():
+    def send(batch):
+        r = requests.Response()
+        r.status_code = 500
+        raise requests.HTTPError('500', response=r)
+
+    with pytest.raises(requests.HTTPError):
+        AdaptiveBatcher().run(OrderedDict([('a', {}), ('b', {})]), send)
+
+
+def test_split_on_timeout():
+    server = serve_in_thread(
+        LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld'),
+        latency=0.6)
+    host = 'localhost:{}'.format(server.server_port)
+    queries = [RQuery('Roman', label=str(i)) for i in range(2)]
+    try:
+        # the default session and one retrying read timeouts itself
+        for session in (None, make_session(max_retries=1,
+                                           backoff_factor=0)):
+            batcher = AdaptiveBatcher(initial_size=4)
+            p_recon = PeriodoReconciler(host, session=session, timeout=0.3,
+                                        batcher=batcher)
+            with pytest.raises(requests.RequestException) as e:
+                p_recon.reconcile(queries, method='POST')
+            assert timed_out(e.value)
+            # the batch of two was split, and its first half timed out
+            assert batcher.splits == 1
+            assert batcher.size == 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,185 @@
+import io
+import json
+import sqlite3
+import threading
+import pytest
+import requests
+from periodo_reconciler import (
+    RQuery,
+    PeriodoReconciler,
+    CsvReconciler,
+    SqliteCache,
+    MemoryCache,
+    LocalPeriodoReconciler,
+    Instrumentation
+)
+from periodo_reconciler.server import serve_in_thread
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / 'cache.sqlite')
+
+
+def test_get_set(cache_path):
+    cache = SqliteCache(cache_path)
+    assert cache.get('k') is None
+    cache.set('k', {'result': []})
+    assert cache.get('k') == {'result': []}
+    assert len(cache) == 1
+
+
+def test_persists_across_instances(cache_path):
+    SqliteCache(cache_path, dataset_version='v1').set('k', [1])
+    assert SqliteCache(cache_path, dataset_version='v1').get('k') == [1]
+
+
+def test_dataset_version_change_clears(cache_path):
+    SqliteCache(cache_path, dataset_version='v1').set('k', [1])
+    assert SqliteCache(cache_path, dataset_version='v2').get('k') is None
+
+
+def test_ttl(cache_path):
+    cache = SqliteCache(cache_path)
+    cache.set('k', [1], ttl=-1)
+    assert cache.get('k') is None
+
+
+def test_max_entries(cache_path):
+    cache = SqliteCache(cache_path, max_entries=2, prune_interval=1)
+    for k in 'abc':
+        cache.set(k, k)
+    assert len(cache) == 2
+    assert cache.get('c') == 'c'
+
+
+def test_batched_touches(cache_path):
+    cache = SqliteCache(cache_path, max_entries=2, prune_interval=1,
+                        touch_interval=1000)
+    cache.set('a', 'a')
+    cache.set('b', 'b')
+    # the hit on a is written before pruning, so b is evicted
+    assert cache.get('a') == 'a'
+    cache.set('c', 'c')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'a'
+
+
+def test_close_all_threads(cache_path):
+    cache = SqliteCache(cache_path)
+    thread = threading.Thread(target=cache.set, args=('k', [1]))
+    thread.start()
+    thread.join()
+    conns = [conn for (pid, conn) in cache._conns.values()]
+    assert len(conns) == 2
+
+    cache.close()
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+    # the cache can still be used, on new connections
+    assert cache.get('k') == [1]
+
+
+def test_dead_threads_conns_closed(cache_path):
+    # the connections of the worker threads of earlier pages are closed
+    # as later threads connect, rather than piling up
+    server = serve_in_thread(
+        LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld'))
+    try:
+        cache = SqliteCache(cache_path)
+        p_recon = PeriodoReconciler(
+            host='localhost:{}'.format(server.server_port), cache=cache,
+            workers=4)
+        data = "query\n" + "".join("roman {}\n".format(i)
+                                   for i in range(100))
+        c_recon = CsvReconciler(io.StringIO(data), p_recon, 'query',
+                                page_size=5)
+        assert len(list(c_recon.matches())) == 100
+    finally:
+        server.shutdown()
+
+    assert len(cache) == 100
+    assert len(cache._conns) <= 1 + 4
+
+
+def test_reconciler_reads_cache(cache_path):
+    # a cache hit must not touch the network
+    cache = SqliteCache(cache_path)
+    p_recon = PeriodoReconciler(host='localhost:1', cache=cache)
+
+    q = RQuery('bronze age', label='q')
+    query_dict_json = json.dumps({'_': q.to_key_value()[1]}, sort_keys=True)
+    cache.set(query_dict_json, {'_': {'result': []}})
+
+    assert (p_recon.reconcile([q], query_by_query=True) ==
+            {'q': {'result': []}})
+
+
+def test_memory_cache():
+    cache = MemoryCache(max_entries=2)
+    for k in 'abc':
+        cache.set(k, k)
+    cache.set('d', 'd', ttl=-1)
+
+    assert cache.get('a') is None
+    assert cache.get('c') == 'c'
+    assert cache.get('d') is None
+    assert cache.stats == {'hits': 1, 'misses': 2, 'evictions': 2,
+                           'expirations': 1}
+
+
+def test_reconciler_cache_policy(cache_path):
+
+    class StubReconciler(PeriodoReconciler):
+        sent = []
+
+        def _query_reconciler(self, queries_json, method='GET'):
+            query = json.loads(queries_json)['_']['query']
+            self.sent.append(query)
+            if query in ('bad', 'down'):
+                r = requests.Response()
+                r.status_code = 400 if query == 'bad' else 503
+                raise requests.HTTPError(query, response=r)
+            return {'_': {'result': [{'name': query}]
+                          if query == 'good' else []}}
+
+    cache = SqliteCache(cache_path)
+    p_recon = StubReconciler(host='localhost:1', cache=cache,
+                             negative_ttl=-1)
+    for query in ['good', 'none', 'bad', 'down'] * 2:
+        try:
+            p_recon.reconcile([RQuery(query)], query_by_query=True)
+        except requests.HTTPError:
+            pass
+
+    # permanent failures are cached, transient ones and (here, already
+    # expired) responses without candidates are not
+    assert StubReconciler.sent == ['good', 'none', 'bad', 'down',
+                                   'none', 'down']
+    assert cache.get(RQuery('good').key.json) is not None
+    assert cache.get(RQuery('none').key.json) is None
+
+
+def test_cached_error_raised_again():
+    server = serve_in_thread(
+        LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld'))
+    try:
+        # every request to an unknown path is a 404
+        instrumentation = Instrumentation()
+        p_recon = PeriodoReconciler(
+            host='localhost:{}/missing'.format(server.server_port),
+            instrumentation=instrumentation)
+        errors = []
+        for i in range(2):
+            with pytest.raises(requests.HTTPError) as e:
+                p_recon.reconcile([RQuery('Roman')], query_by_query=True)
+            errors.append(e.value)
+    finally:
+        server.shutdown()
+
+    assert server.request_count == 1
+    assert instrumentation.counters['errors_cached'] == 1
+    assert errors[1].response.status_code == 404
+    assert errors[1].response.url == errors[0].response.url
+    assert str(errors[1]) == str(errors[0])
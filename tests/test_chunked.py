@@ -0,0 +1,78 @@
+import csv
+import io
+import pytest
+from periodo_reconciler import (
+    CsvReconciler,
+    LocalPeriodoReconciler,
+    Instrumentation
+)
+from periodo_reconciler.chunked import (
+    chunk_offsets,
+    chunked_matches
+)
+
+
+def write_csv(path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'note', 'period', 'place'])
+        for i in range(200):
+            writer.writerow([i, 'a "quoted"\nnote' if i % 7 == 0 else '',
+                             ['Late Roman', 'Roman', 'Hellenistic',
+                              'Nothing at all'][i % 4],
+                             ['Cyprus', 'Ukraine', ''][i % 3]])
+
+
+def test_chunk_offsets(tmp_path):
+    path = str(tmp_path / 'in.csv')
+    write_csv(path)
+
+    offsets = chunk_offsets(path, 6)
+    assert len(offsets) > 1
+    assert all(a[1] == b[0] for (a, b) in zip(offsets, offsets[1:]))
+
+    # every chunk parses to whole rows
+    with open(path, 'rb') as f:
+        data = f.read()
+    ids = []
+    for (start, end) in offsets:
+        text = data[start:end].decode('utf-8')
+        ids.extend(int(row[0]) for row in csv.reader(io.StringIO(text)))
+    assert ids == list(range(200))
+
+
+def test_unbalanced_header(tmp_path):
+    path = tmp_path / 'in.csv'
+    path.write_bytes(b'id,"period,place\n' + b'1,Roman,Cyprus\n' * 100)
+    with pytest.raises(ValueError):
+        chunk_offsets(str(path), 2)
+
+
+def test_chunked_matches(tmp_path):
+    path = str(tmp_path / 'in.csv')
+    write_csv(path)
+    kw = {'query': 'period', 'location': 'place', 'page_size': 30}
+
+    with open(path, newline='', encoding='utf-8') as f:
+        serial = CsvReconciler(
+            f, LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld'), **kw)
+        serial_rows = list(serial.matches())
+
+    with open(path, newline='', encoding='utf-8') as f:
+        chunked = CsvReconciler(f, None, instrumentation=Instrumentation(),
+                                **kw)
+        chunked_rows = list(chunked_matches(
+            chunked, {'dataset': 'data/p0dg76f.jsonld'},
+            processes=2, chunks=5))
+
+    assert chunked_rows == serial_rows
+    assert chunked.match_summary == serial.match_summary
+    assert chunked.dedup_stats['rows'] == 200
+    # the workers' instrumentation is merged into the parent's
+    assert chunked.instrumentation.counters['rows'] == 200
+    assert chunked.instrumentation.calls['matches'] == 200
+
+    with pytest.raises(ValueError):
+        list(chunked_matches(CsvReconciler(io.StringIO('period\nRoman\n'),
+                                           None, query='period'),
+                             {'dataset': 'data/p0dg76f.jsonld'}))
@@ -0,0 +1,74 @@
+import csv
+import json
+import subprocess
+import sys
+import pytest
+from periodo_reconciler import LocalPeriodoReconciler
+from periodo_reconciler.incremental import STATE_SUFFIX
+from periodo_reconciler.server import serve_in_thread
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = serve_in_thread(
+        LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld'))
+    yield server
+    server.shutdown()
+
+
+def run_cli(*args, input=None):
+    return subprocess.run(
+        [sys.executable, 'bin/periodo-reconciler-py'] + list(args),
+        capture_output=True, text=True, input=input,
+        env={'PYTHONPATH': '.', 'PATH': ''})
+
+
+def test_verbose(server, tmp_path):
+    output = str(tmp_path / 'out.csv')
+    r = run_cli('test-data/periodo_simple_example.csv', output,
+                '--query', 'query', '--location', 'location',
+                '--host', 'localhost:{}'.format(server.server_port),
+                '--verbose')
+    assert r.returncode == 0, r.stderr
+    assert 'memory cache: ' in r.stderr
+    with open(output, newline='', encoding='utf-8') as f:
+        assert len(list(csv.DictReader(f)))
+
+
+def test_processes(tmp_path):
+    output = str(tmp_path / 'out.csv')
+    args = ['--query', 'query', '--location', 'location',
+            '--dataset', 'data/p0dg76f.jsonld', '--processes', '2']
+    r = run_cli('test-data/periodo_simple_example.csv', output,
+                '--profile-report', *args)
+    assert r.returncode == 0, r.stderr
+    assert '"rows": 5' in r.stderr
+
+    with open('test-data/periodo_simple_example.csv', encoding='utf-8') as f:
+        r = run_cli('-', output, *args, input=f.read())
+    assert r.returncode == 2
+    assert '--processes needs a file, not stdin' in r.stderr
+
+
+def test_previous_dataset_version(tmp_path):
+    dataset = tmp_path / 'dataset.jsonld'
+    with open('data/p0dg76f.jsonld', 'rb') as f:
+        dataset.write_bytes(f.read())
+    output = str(tmp_path / 'out.csv')
+    args = ['test-data/periodo_simple_example.csv', output,
+            '--query', 'query', '--location', 'location',
+            '--dataset', str(dataset), '--verbose']
+
+    # an ordinary run leaves a state file for the next to reuse
+    assert run_cli(*args).returncode == 0
+    args += ['--previous', output]
+    with open(output + STATE_SUFFIX, encoding='utf-8') as f:
+        assert json.load(f)['dataset_version'].startswith('sha256:')
+    r = run_cli(*args)
+    assert 'reused from previous output: 5 rows' in r.stderr
+
+    # a changed dataset file is a new version
+    with open(dataset, 'ab') as f:
+        f.write(b'\n')
+    r = run_cli(*args)
+    assert '0 rows (dataset version changed)' in r.stderr
@@ -7,11 +7,13 @@ from periodo_reconciler import (
     RProperty,
     RQuery,
     PeriodoReconciler,
-    CsvReconciler
+    CsvReconciler,
+    MatchResult,
+    QueryFilter
 )
 from collections import OrderedDict
 
-from .fixtures import p_recon
+from .fixtures import p_recon, fake_recon
 
 
 def output_path_name(inpath):
@@ -127,3 +129,153 @@ def test_match_summary_to_csv(p_recon):
         io.StringIO(match_summary_output.getvalue())))
     for row in summary_reader:
         assert int(row['row_count']) == 1
+
+
+def test_dedup(fake_recon):
+    csvfile = io.StringIO("query,location\n" +
+                          "a,x\nb,x\na,x\na,y\n" * 3)
+    c_recon = CsvReconciler(csvfile, fake_recon, 'query', 'location',
+                            page_size=5)
+    rows = list(c_recon.matches())
+
+    assert [row['query'] for row in rows] == list('abaa') * 3
+    assert [row['match_id'] for row in rows] == [
+        'http://example.org/' + q for q in 'abaa' * 3]
+    assert len(fake_recon.queries) == 3
+    assert c_recon.dedup_stats == {'rows': 12, 'queries': 3}
+    assert c_recon.dedup_ratio == 4
+    # only trimmed results are kept for the distinct queries
+    assert c_recon._responses_for_key[('a', 'x')] == MatchResult(
+        1, 1, 'http://example.org/a', 'A')
+
+    # results_with_rows still yields the reconciler's responses
+    csvfile.seek(0)
+    c_recon = CsvReconciler(csvfile, fake_recon, 'query', 'location',
+                            page_size=5)
+    pairs = list(c_recon.results_with_rows())
+    assert [row['query'] for (row, response) in pairs] == list('abaa') * 3
+    assert all(isinstance(response, dict) for (row, response) in pairs)
+    assert pairs[0][1]['result'][0]['id'] == 'http://example.org/a'
+
+    csvfile.seek(0)
+    fake_recon.queries = []
+    c_recon = CsvReconciler(csvfile, fake_recon, 'query', 'location',
+                            dedup=False)
+    assert rows == list(c_recon.matches())
+    assert len(fake_recon.queries) == 12
+
+
+def test_streaming(fake_recon):
+    # the last row is short, so its location is None
+    data = "query,location\n" + "a,x\n,x\nb,y\n" * 4 + "c\n"
+
+    c_recon = CsvReconciler(io.StringIO(data), fake_recon,
+                            'query', 'location')
+    rows = list(c_recon.matches())
+
+    s_recon = CsvReconciler(io.StringIO(data), fake_recon,
+                            'query', 'location', streaming=True)
+    assert list(s_recon.matches()) == rows
+    assert rows[-1]['location'] is None
+    assert s_recon.match_summary == c_recon.match_summary
+
+
+def test_checkpoint_resume(fake_recon, tmp_path):
+    # 40 rows with 30 distinct queries, in pages of 4
+    data = "query\n" + "".join("q{}\n".format(i % 30) for i in range(40))
+    checkpoint = str(tmp_path / 'journal')
+
+    class FlakyReconciler(type(fake_recon)):
+        # dies on the third page
+        calls = 0
+
+        def reconcile(self, queries, **kwargs):
+            self.calls += 1
+            if self.calls == 3:
+                raise IOError('reconciler went away')
+            return super().reconcile(queries, **kwargs)
+
+    for (dedup, remaining) in ((True, 30 - 8), (False, 40 - 8)):
+        expected = list(CsvReconciler(io.StringIO(data), fake_recon,
+                                      'query', page_size=4,
+                                      dedup=dedup).matches())
+
+        c_recon = CsvReconciler(io.StringIO(data), FlakyReconciler(),
+                                'query', page_size=4, dedup=dedup,
+                                checkpoint=checkpoint)
+        with pytest.raises(IOError):
+            list(c_recon.matches())
+
+        # simulate a write cut short by the crash
+        with open(checkpoint, 'a') as f:
+            f.write('{"page": 2, "respo')
+
+        resumed_recon = type(fake_recon)()
+        c_recon = CsvReconciler(io.StringIO(data), resumed_recon,
+                                'query', page_size=4, dedup=dedup,
+                                checkpoint=checkpoint, resume=True)
+        assert list(c_recon.matches()) == expected
+        assert len(resumed_recon.queries) == remaining
+
+
+def test_checkpoint_fingerprint(fake_recon, tmp_path):
+    checkpoint = str(tmp_path / 'journal')
+    list(CsvReconciler(io.StringIO("query\na\n"), fake_recon, 'query',
+                       checkpoint=checkpoint).matches())
+    with pytest.raises(ValueError):
+        list(CsvReconciler(io.StringIO("query\na\n"), fake_recon, 'query',
+                           transpose_query=True, checkpoint=checkpoint,
+                           resume=True).matches())
+
+    # the same run against another service or dataset
+    other_recon = type(fake_recon)()
+    other_recon.base_url = 'http://elsewhere/'
+    with pytest.raises(ValueError):
+        list(CsvReconciler(io.StringIO("query\na\n"), other_recon, 'query',
+                           checkpoint=checkpoint, resume=True).matches())
+
+    for header in ('', '{"fingerprint": {"inp'):
+        with open(checkpoint, 'w') as f:
+            f.write(header)
+        with pytest.raises(ValueError, match='corrupt checkpoint'):
+            list(CsvReconciler(io.StringIO("query\na\n"), fake_recon,
+                               'query', checkpoint=checkpoint,
+                               resume=True).matches())
+
+
+def test_prefilter(fake_recon):
+    data = "query,location\n" + "a,x\n,x\n Other ,x\nlb 2,x\nb,y\n" * 2
+    prefilter = QueryFilter(['other'], patterns=[r'lb \d+'])
+
+    for dedup in (True, False):
+        fake_recon.queries = []
+        c_recon = CsvReconciler(io.StringIO(data), fake_recon,
+                                'query', 'location', dedup=dedup,
+                                prefilter=prefilter)
+        rows = list(c_recon.matches())
+
+        assert sorted(set(q.query for q in fake_recon.queries)) == ['a', 'b']
+        assert [row['match_id'] != '' for row in rows] == [
+            True, False, False, False, True] * 2
+        assert rows[2]['candidates_count'] == 0
+        assert c_recon.skip_counts == {'empty': 2, 'ignored': 2,
+                                       'pattern': 2}
+
+        # skipped rows get the same stand-in with or without dedup
+        c_recon = CsvReconciler(io.StringIO(data), fake_recon,
+                                'query', 'location', dedup=dedup,
+                                prefilter=prefilter)
+        assert list(c_recon.results_with_rows())[1][1] == {'result': []}
+        c_recon = CsvReconciler(io.StringIO(data), fake_recon,
+                                'query', 'location', dedup=dedup,
+                                prefilter=prefilter)
+        assert list(c_recon._results_with_rows(trim=True))[1][1] == (
+            MatchResult(0, 0, '', ''))
+
+    # a short row has no query at all
+    assert prefilter.reason(None) == 'empty'
+    c_recon = CsvReconciler(io.StringIO("location,query\nx\ny,b\n"),
+                            fake_recon, 'query', 'location',
+                            prefilter=prefilter)
+    assert [row['match_id'] for row in c_recon.matches()] == [
+        '', 'http://example.org/b']
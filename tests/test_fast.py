@@ -0,0 +1,77 @@
+import csv
+import io
+import pytest
+from periodo_reconciler import (
+    CsvReconciler,
+    LocalPeriodoReconciler
+)
+from periodo_reconciler.fast import (
+    FastCsvReconciler,
+    mmap_lines
+)
+
+DATA = ('id,note,period,place\r\n'
+        '1,"a ""quoted""\nnote",Late Roman,Cyprus\r\n'
+        '2,,Roman,Ukraine\r\n'
+        '\r\n'
+        '3,short,Hellenistic\r\n'
+        '4,,Nothing at all,\r\n'
+        '5,"plain",Roman,Cyprus\r\n')
+
+KW = {'query': 'period', 'location': 'place', 'page_size': 2}
+
+
+def reconcile(cls, csvfile, **kw):
+    p_recon = LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld')
+    c_recon = cls(csvfile, p_recon, **KW, **kw)
+    output = io.StringIO()
+    c_recon.to_csv(output, c_recon.matches())
+    return (c_recon, output.getvalue())
+
+
+def test_fast_same_as_csv():
+    (c_recon, expected) = reconcile(CsvReconciler, io.StringIO(DATA))
+    (f_recon, output) = reconcile(FastCsvReconciler, io.StringIO(DATA))
+
+    assert (list(csv.reader(io.StringIO(output))) ==
+            list(csv.reader(io.StringIO(expected))))
+    assert f_recon.match_summary == c_recon.match_summary
+
+    # the input's columns keep their quoting; the short row is padded
+    lines = output.splitlines()
+    assert lines[0].startswith('id,note,period,place,match_num,')
+    assert '5,"plain",Roman,Cyprus,' in output
+    assert '3,short,Hellenistic,,' in output
+
+    (_, streamed) = reconcile(FastCsvReconciler, io.StringIO(DATA),
+                              streaming=True)
+    assert streamed == output
+
+
+def test_fast_long_row():
+    data = DATA + '6,,Roman,Cyprus,extra\r\n'
+    for cls in (CsvReconciler, FastCsvReconciler):
+        with pytest.raises(ValueError):
+            reconcile(cls, io.StringIO(data))
+
+
+def test_fast_mmap(tmp_path):
+    path = tmp_path / 'in.csv'
+    path.write_bytes(DATA.encode('utf-8'))
+
+    with open(path, newline='', encoding='utf-8') as f:
+        (_, expected) = reconcile(FastCsvReconciler, f)
+    (_, output) = reconcile(FastCsvReconciler, mmap_lines(str(path)))
+    assert output == expected
+
+
+def test_fast_fieldnames():
+    p_recon = LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld')
+    f_recon = FastCsvReconciler(io.StringIO(DATA), p_recon, **KW)
+    output = io.StringIO()
+    fieldnames = list(reversed(f_recon._output_fieldnames()))
+    f_recon.to_csv(output, f_recon.matches(), fieldnames=fieldnames)
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert list(rows[0]) == fieldnames
+    assert [row['id'] for row in rows] == ['1', '2', '3', '4', '5']
+    assert rows[0]['note'] == 'a "quoted"\nnote'
@@ -0,0 +1,78 @@
+import io
+import pytest
+from periodo_reconciler import (
+    CsvReconciler,
+    LocalPeriodoReconciler,
+    QueryFilter
+)
+
+pd = pytest.importorskip('pandas')
+
+from periodo_reconciler.frame import reconcile_frame  # noqa: E402
+
+DATA = "id,period,place,start,stop\n" + (
+        "1,Late Roman,Cyprus,300,700\n"
+        "2,Late Roman,Ukraine,300,700\n"
+        "3,Roman,Cyprus,,\n"
+        "4,Classical,Cyprus,-500,-300\n"
+        "5,,Cyprus,,\n"
+        "6,Hellenistic,Cyprus,-300,-30\n") * 3
+
+
+@pytest.fixture(scope='module')
+def l_recon():
+    return LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld')
+
+
+def test_reconcile_frame(l_recon):
+    kw = {'query': 'period', 'location': 'place', 'start': 'start',
+          'stop': 'stop', 'ignored_queries': 'Classical'}
+
+    c_recon = CsvReconciler(io.StringIO(DATA), l_recon, **kw)
+    expected = io.StringIO()
+    c_recon.to_csv(expected, c_recon.matches())
+    expected_summary = io.StringIO()
+    c_recon.match_summary_to_csv(expected_summary)
+
+    df = pd.read_csv(io.StringIO(DATA), dtype=str, keep_default_na=False)
+    (frame, summary, stats) = reconcile_frame(df, l_recon, **kw)
+
+    assert frame.to_csv(index=False, lineterminator='\r\n') == \
+        expected.getvalue()
+    assert summary.to_csv(index=False, lineterminator='\r\n') == \
+        expected_summary.getvalue()
+    assert stats == {'rows': 18, 'queries': 6}
+    assert list(df.columns) == ['id', 'period', 'place', 'start', 'stop']
+
+    # read_csv's defaults make floats of the years, as some are blank,
+    # but the same queries are sent
+    (float_frame, float_summary, float_stats) = reconcile_frame(
+        pd.read_csv(io.StringIO(DATA)), l_recon, **kw)
+    assert float_frame['start'].dtype == float
+    match_columns = list(CsvReconciler.match_column_fields)
+    assert float_frame[match_columns].equals(frame[match_columns])
+    assert float_summary.equals(summary)
+    assert float_stats == stats
+
+    # and the years still filter the candidates
+    years = pd.read_csv(io.StringIO("period,place,start,stop\n"
+                                    "Late Roman,Cyprus,1500,1600\n"
+                                    "Late Roman,Cyprus,,\n"))
+    result = reconcile_frame(years, l_recon, **dict(kw, ignored_queries=''))
+    assert list(result.frame['candidates_count']) == [0, 1]
+
+
+def test_reconcile_frame_prefilter(l_recon):
+
+    class Table(object):
+        # stands in for a pyarrow.Table
+        def to_pandas(self):
+            return pd.read_csv(io.StringIO(DATA))
+
+    result = reconcile_frame(Table(), l_recon, 'period',
+                             prefilter=QueryFilter(['roman']))
+
+    assert result.stats == {'rows': 18, 'queries': 3,
+                            'skipped_empty': 3, 'skipped_ignored': 3}
+    assert (result.frame['candidates_count'][result.frame['period']
+                                             .isin(['Roman'])] == 0).all()
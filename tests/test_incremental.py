@@ -0,0 +1,102 @@
+import csv
+import io
+from periodo_reconciler import (
+    CsvReconciler,
+    LocalPeriodoReconciler
+)
+from periodo_reconciler.fast import FastCsvReconciler
+from periodo_reconciler.incremental import (
+    PreviousOutput,
+    write_state
+)
+
+PERIODS = ['Late Roman', 'Roman', 'Hellenistic', 'Nothing at all']
+PLACES = ['Cyprus', 'Ukraine', '']
+
+
+class CountingReconciler(LocalPeriodoReconciler):
+
+    def reconcile(self, queries, method='GET', query_by_query=False):
+        self.sent = getattr(self, 'sent', 0) + len(queries)
+        return super().reconcile(queries, method=method,
+                                 query_by_query=query_by_query)
+
+
+def write_input(path, n, changed=()):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'period', 'place'])
+        for i in range(n):
+            writer.writerow([i, 'Neolithic' if i in changed
+                             else PERIODS[i % 4], PLACES[i % 3]])
+
+
+def run(path, output_path=None, previous=None, cls=CsvReconciler, **kw):
+    p_recon = CountingReconciler.from_file('data/p0dg76f.jsonld')
+    with open(path, newline='', encoding='utf-8') as f:
+        c_recon = cls(f, p_recon, query='period', location='place',
+                      page_size=7, previous=previous, **kw)
+        output = io.StringIO()
+        c_recon.to_csv(output, c_recon.matches())
+    if output_path is not None:
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            f.write(output.getvalue())
+        write_state(output_path, c_recon, 'v1')
+    return (c_recon, output.getvalue(), getattr(p_recon, 'sent', 0))
+
+
+def test_incremental(tmp_path):
+    in_path = str(tmp_path / 'in.csv')
+    out_path = str(tmp_path / 'out.csv')
+
+    write_input(in_path, 40)
+    previous = PreviousOutput(out_path, dataset_version='v1')
+    (c_recon, _, _) = run(in_path, out_path, previous)
+    assert previous.reason == 'no previous output'
+    assert c_recon.dedup_stats['reused'] == 0
+
+    # rows appended and one row changed
+    write_input(in_path, 50, changed={3})
+    (full, expected, full_sent) = run(in_path)
+
+    previous = PreviousOutput(out_path, dataset_version='v1')
+    (c_recon, output, sent) = run(in_path, out_path, previous)
+    assert previous.reason is None
+    assert output == expected
+    assert c_recon.match_summary == full.match_summary
+    assert c_recon.dedup_stats['reused'] == 39
+    assert c_recon.dedup_stats['rows'] == 50
+    # the appended rows repeat query tuples of the reused ones
+    assert sent == 1 < full_sent
+
+    previous = PreviousOutput(out_path, dataset_version='v2')
+    (c_recon, output, sent) = run(in_path, previous=previous)
+    assert previous.reason == 'dataset version changed'
+    assert c_recon.dedup_stats['reused'] == 0
+    assert output == expected
+
+    previous = PreviousOutput(out_path, dataset_version='v1')
+    (c_recon, output, _) = run(in_path, previous=previous,
+                               transpose_query=True)
+    assert previous.reason == 'settings changed'
+
+
+def test_incremental_key_column(tmp_path):
+    in_path = str(tmp_path / 'in.csv')
+    out_path = str(tmp_path / 'out.csv')
+
+    write_input(in_path, 20)
+    run(in_path, out_path, ignored_queries='Roman')
+
+    write_input(in_path, 20, changed={0})
+    (_, expected, _) = run(in_path, ignored_queries='Roman', dedup=False)
+    for cls in (CsvReconciler, FastCsvReconciler):
+        previous = PreviousOutput(out_path, key_column='id',
+                                  dataset_version='v1')
+        (c_recon, output, sent) = run(in_path, previous=previous, cls=cls,
+                                      ignored_queries='Roman', dedup=False)
+        assert list(csv.reader(io.StringIO(output))) == list(
+            csv.reader(io.StringIO(expected)))
+        # the changed row and the rows whose query was ignored
+        assert sent == 1 + 5
+        assert c_recon.dedup_stats['reused'] == 14
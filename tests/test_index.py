@@ -0,0 +1,121 @@
+import io
+import pytest
+from periodo_reconciler import (
+    LabelIndex,
+    IntervalIndex,
+    SpatialIndex,
+    normalize_label,
+    read_periods
+)
+
+
+@pytest.fixture(scope='module')
+def periods():
+    return read_periods('data/p0dg76f.jsonld')
+
+
+def test_normalize_label():
+    assert normalize_label('  Bashkëkohore ') == 'bashkekohore'
+    assert normalize_label('北宋') == '北宋'
+    assert (normalize_label('Ранньоримський') ==
+            normalize_label('РАННЬОРИМСЬКИИ'))
+
+
+def test_label_index():
+    index = LabelIndex([(0, 'Northern Song'), (0, '北宋'),
+                        (1, 'Bashkëkohore'), (2, 'Song dynasty')])
+    assert index.exact('northern  song') == [0]
+    assert index.exact('北宋') == [0]
+    assert index.all_words('song') == [0, 2]
+    assert index.prefix('bashkek') == [1]
+    assert index.prefix('so') == [0, 2]
+    assert index.search('Bashkekohor', k=1)[0][0] == 1
+
+
+def test_from_periods_and_serialize(periods):
+    index = LabelIndex.from_periods(periods)
+    assert len(index.prefix('late cyp')) == 7
+
+    f = io.StringIO()
+    index.dump(f)
+    f.seek(0)
+    loaded = LabelIndex.load(f)
+
+    for q in ['Late Roman', 'roman', 'hellenistc']:
+        assert loaded.exact(q) == index.exact(q)
+        assert loaded.all_words(q) == index.all_words(q)
+        assert loaded.search(q) == index.search(q)
+    assert loaded.prefix('late') == index.prefix('late')
+
+
+def test_interval_index(periods):
+    import random
+
+    index = IntervalIndex.from_periods(periods)
+    random.seed(0)
+    for _ in range(200):
+        (start, stop) = sorted(random.randint(-10000, 2100)
+                               for _ in range(2))
+        assert index.overlapping(start, stop) == [
+            i for (i, p) in enumerate(periods)
+            if p.start <= stop and p.stop >= start]
+        assert index.containing(start, stop) == [
+            i for (i, p) in enumerate(periods)
+            if p.start <= start and p.stop >= stop]
+
+
+def test_interval_index_unbounded():
+    index = IntervalIndex([(0, None, 100), (1, 50, None), (2, 200, 300)])
+    assert index.overlapping(60, 70) == [0, 1]
+    assert index.overlapping(150, None) == [1, 2]
+    assert index.within(150, 400) == [2]
+    assert index.fit(2, 200, 300) == 1.0
+    assert index.fit(2, 250, 300) == 0.5
+    assert index.fit(0, 0, 10) is None
+    assert index.fit_columns([2, 2, None], ['200', '200', ''],
+                             ['300', '300', '']) == [1.0, 1.0, None]
+
+
+def test_rerank(periods):
+    index = IntervalIndex.from_periods(periods)
+    results = [{'id': p.id} for p in periods[:10]] + [{'id': 'other'}]
+    reranked = index.rerank(results, 300, 749)
+    assert reranked[-1] == {'id': 'other'}
+    fits = [index.fit(index.id_to_doc[r['id']], 300, 749)
+            for r in reranked[:-1]]
+    assert fits == sorted(fits, reverse=True)
+
+    # the match_id column of a CSV, with an unmatched row
+    ids = [reranked[0]['id'], '', 'other']
+    assert index.fit_columns(ids, ['300'] * 3, ['749'] * 3) == [
+        fits[0], None, None]
+
+
+def test_spatial_index(periods):
+    from periodo_reconciler.index import bitmap_from_docs, docs_from_bitmap
+
+    index = SpatialIndex.from_periods(periods)
+    everything = list(range(len(periods)))
+    assert docs_from_bitmap(index.lookup('Cyprus')) == everything
+    assert (index.lookup('http://dbpedia.org/resource/Cyprus') ==
+            index.lookup(' cyprus '))
+    assert index.lookup('Ukraine') == 0
+
+    index = SpatialIndex([
+        (0, [('http://www.wikidata.org/entity/Q212', 'Ukraine')], ''),
+        (1, [('http://dbpedia.org/resource/Northern_Cyprus', '')], ''),
+        (2, [], 'Levant')])
+    assert docs_from_bitmap(index.lookup('Q212')) == [0]
+    assert docs_from_bitmap(index.lookup('cyprus')) == [1]
+    assert index.filter([2, 1, 0], 'levant') == [2]
+
+    # a location that is a key still matches the keys containing it
+    index = SpatialIndex([
+        (0, [('', 'Cyprus')], ''),
+        (1, [('', 'Northern Cyprus')], ''),
+        (2, [], 'Cyprus and Crete')], max_lookups=2)
+    assert docs_from_bitmap(index.lookup('Cyprus')) == [0, 1, 2]
+    for location in ['crete', 'northern', 'cyprus']:
+        index.lookup(location)
+    assert len(index._lookups) <= 2
+    assert docs_from_bitmap(bitmap_from_docs([3, 0, 5])) == [0, 3, 5]
@@ -0,0 +1,66 @@
+import io
+import json
+import pytest
+from periodo_reconciler import (
+    RProperty,
+    RQuery,
+    CsvReconciler,
+    LocalPeriodoReconciler
+)
+
+
+@pytest.fixture(scope='module')
+def l_recon():
+    return LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld')
+
+
+def test_reconcile(l_recon):
+    r = l_recon.reconcile([
+        RQuery('late roman', label='exact'),
+        RQuery('Roman', label='limited', limit=1),
+        RQuery('cypriot', label='partial'),
+        RQuery('Late Roman', label='elsewhere',
+               properties=[RProperty('location', 'Ukraine')]),
+        RQuery('Late Roman', label='too-early',
+               properties=[RProperty('start', -3000),
+                           RProperty('stop', -2000)])
+    ])
+
+    assert r['exact'] == {'result': [{
+        'id': 'http://n2t.net/ark:/99152/p0dg76fbqff',
+        'name': 'Late Roman [Cyprus, Cyprus: 0300 to 0749]',
+        'score': 1.0,
+        'match': True,
+        'type': [{'id': 'http://www.w3.org/2004/02/skos/core#Concept',
+                  'name': 'Period definition'}]}]}
+    assert len(r['limited']['result']) == 1
+    assert r['limited']['result'][0]['match']
+    assert len(r['partial']['result']) > 1
+    assert not any(result['match'] for result in r['partial']['result'])
+    assert r['elsewhere'] == {'result': []}
+    assert r['too-early'] == {'result': []}
+
+
+def test_suggest_and_preview(l_recon):
+    ids = [result['id'] for result in l_recon.suggest_entities('late cyp')]
+    assert len(ids) == 7
+
+    assert b'<!doctype html>' in l_recon.preview_period(ids[0])
+    assert 'html' in json.loads(
+        l_recon.preview_period(ids[0], flyout=True).decode('utf-8'))
+
+
+def test_csv(l_recon):
+    csvfile = io.StringIO('query,location\nRoman,Cyprus\nnonsense,\n')
+    c_recon = CsvReconciler(csvfile, l_recon, 'query', 'location')
+    rows = list(c_recon.matches())
+    assert rows[0]['match_name'] == 'Roman [Cyprus, Cyprus: -0098 to 0749]'
+    assert rows[1]['match_num'] == 0
+
+
+def test_dataset_version(l_recon):
+    assert l_recon.path == 'data/p0dg76f.jsonld'
+    assert l_recon.dataset_version.startswith('sha256:')
+    other = LocalPeriodoReconciler(l_recon.periods[1:])
+    assert other.path is None
+    assert other.dataset_version != l_recon.dataset_version
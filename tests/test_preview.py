@@ -0,0 +1,90 @@
+import pytest
+from periodo_reconciler import (
+    PeriodoReconciler,
+    LocalPeriodoReconciler,
+    Instrumentation,
+    PreviewStore
+)
+from periodo_reconciler.server import serve_in_thread
+
+
+@pytest.fixture(scope='module')
+def l_recon():
+    return LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld')
+
+
+@pytest.fixture(scope='module')
+def server(l_recon):
+    server = serve_in_thread(l_recon)
+    yield server
+    server.shutdown()
+
+
+def objects(store):
+    return store._conn().execute(
+        'SELECT COUNT(*) FROM objects').fetchone()[0]
+
+
+def test_preview_store(tmp_path):
+    store = PreviewStore(str(tmp_path / 'previews.sqlite'))
+    assert store.get('a') is None
+
+    store.set('a', False, b'<div>A</div>', etag='"1"')
+    store.set('b', False, b'<div>A</div>')
+    store.set('a', True, b'{"html": "<div>A</div>"}' * 10)
+    assert len(store) == 3
+    # the same body is stored once
+    assert objects(store) == 2
+
+    stored = store.get('a')
+    assert stored.body == b'<div>A</div>'
+    assert store.get('a', True).body == b'{"html": "<div>A</div>"}' * 10
+    assert stored.etag == '"1"'
+    assert stored.fresh
+
+    store.set('b', False, b'<div>B</div>')
+    assert objects(store) == 3
+    assert store.prune() == 0
+    store.set('a', False, b'<div>B</div>')
+    assert store.prune() == 1
+    assert store.get('a').body == b'<div>B</div>'
+
+    store.clear()
+    assert len(store) == 0
+    assert objects(store) == 0
+
+
+def test_preview_store_prunes(tmp_path):
+    store = PreviewStore(str(tmp_path / 'previews.sqlite'), prune_interval=2)
+    store.set('a', False, b'<div>A</div>')
+    store.set('a', False, b'<div>B</div>')
+    assert objects(store) == 1
+
+
+def test_preview_periods(server, l_recon, tmp_path):
+    host = 'localhost:{}'.format(server.server_port)
+    ids = [p.id for p in l_recon.periods[:10]]
+    expected = dict((i, l_recon.preview_period(i)) for i in ids)
+
+    instrumentation = Instrumentation()
+    store = PreviewStore(str(tmp_path / 'previews.sqlite'), max_age=3600)
+    p_recon = PeriodoReconciler(host=host, workers=4, preview_store=store,
+                                instrumentation=instrumentation)
+
+    previews = p_recon.preview_periods(ids + ids[:3])
+    assert list(previews) == ids
+    assert previews == expected
+    assert instrumentation.counters['requests_sent'] == 10
+
+    assert p_recon.preview_periods(ids) == expected
+    assert instrumentation.counters['requests_sent'] == 10
+    assert instrumentation.counters['previews_stored'] == 10
+
+    # once stale, previews are revalidated rather than fetched again
+    store.max_age = 0
+    assert p_recon.preview_periods(ids, workers=1) == expected
+    assert instrumentation.counters['requests_sent'] == 20
+    assert instrumentation.counters['previews_revalidated'] == 10
+
+    flyout = p_recon.preview_periods(ids[:1], flyout=True)
+    assert flyout[ids[0]] == l_recon.preview_period(ids[0], flyout=True)
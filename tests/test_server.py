@@ -0,0 +1,99 @@
+import io
+import json
+import pytest
+import requests
+from periodo_reconciler import (
+    RQuery,
+    PeriodoReconciler,
+    LocalPeriodoReconciler,
+    CsvReconciler
+)
+from periodo_reconciler.server import serve_in_thread
+
+
+@pytest.fixture(scope='module')
+def l_recon():
+    return LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld')
+
+
+@pytest.fixture(scope='module')
+def server(l_recon):
+    server = serve_in_thread(l_recon)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def mock_recon(server):
+    return PeriodoReconciler(
+        host='localhost:{}'.format(server.server_port))
+
+
+def test_describe(mock_recon):
+    assert set(mock_recon.describe().keys()) == {'defaultTypes',
+                                                 'identifierSpace',
+                                                 'name',
+                                                 'preview',
+                                                 'schemaSpace',
+                                                 'suggest',
+                                                 'view'}
+
+
+def test_api_matches_local(mock_recon, l_recon):
+    queries = [RQuery('Late Roman', label='a'),
+               RQuery('roman', label='b', limit=2)]
+    for method in ('get', 'post'):
+        assert (mock_recon.reconcile(queries, method=method) ==
+                l_recon.reconcile(queries))
+    assert (mock_recon.suggest_entities('late') ==
+            l_recon.suggest_entities('late'))
+    assert mock_recon.suggest_properties() == l_recon.suggest_properties()
+
+    period_id = l_recon.periods[0].id
+    assert (mock_recon.preview_period(period_id) ==
+            l_recon.preview_period(period_id))
+    assert 'html' in json.loads(
+        mock_recon.preview_period(period_id, flyout=True).decode('utf-8'))
+
+
+def test_csv(mock_recon, l_recon):
+    data = 'query,location\nRoman,Cyprus\nClassical,\nnonsense,\n'
+    rows = list(CsvReconciler(io.StringIO(data), mock_recon,
+                              'query', 'location').matches())
+    assert rows == list(CsvReconciler(io.StringIO(data), l_recon,
+                                      'query', 'location').matches())
+
+
+def test_errors(l_recon):
+    server = serve_in_thread(l_recon, error_rate=1.0)
+    p_recon = PeriodoReconciler(
+        host='localhost:{}'.format(server.server_port), max_retries=0)
+    with pytest.raises(requests.HTTPError):
+        p_recon.reconcile([RQuery('Roman')])
+    server.shutdown()
+
+
+def test_instrumentation(server):
+    from periodo_reconciler import Instrumentation
+
+    events = []
+    instrumentation = Instrumentation(
+        hooks=[lambda kind, name, value: events.append((kind, name))])
+    p_recon = PeriodoReconciler(
+        host='localhost:{}'.format(server.server_port),
+        instrumentation=instrumentation)
+
+    data = 'query\nRoman\nClassical\nRoman\nUnknown\n'
+    c_recon = CsvReconciler(io.StringIO(data), p_recon, 'query', dedup=False)
+    c_recon.to_csv(io.StringIO(), c_recon.matches())
+
+    summary = instrumentation.summary()
+    assert set(summary['stages']) == {
+        'csv_parse', 'query_build', 'serialize', 'http', 'reconcile',
+        'matches', 'fallback', 'to_csv'}
+    assert summary['counters']['rows'] == 4
+    assert summary['counters']['lru_lookups'] == 4
+    assert summary['counters']['requests_sent'] == \
+        summary['counters']['lru_misses']
+    assert summary['counters']['bytes_received'] > 0
+    assert ('count', 'requests_sent') in events
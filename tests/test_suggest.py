@@ -0,0 +1,67 @@
+import pytest
+from periodo_reconciler import (
+    PeriodoReconciler,
+    LocalPeriodoReconciler,
+    Instrumentation,
+    SuggestCache
+)
+from periodo_reconciler.server import serve_in_thread
+
+
+@pytest.fixture(scope='module')
+def l_recon():
+    return LocalPeriodoReconciler.from_file('data/p0dg76f.jsonld')
+
+
+@pytest.fixture(scope='module')
+def server(l_recon):
+    server = serve_in_thread(l_recon)
+    yield server
+    server.shutdown()
+
+
+def test_suggest_cache(server, l_recon):
+    instrumentation = Instrumentation()
+    suggest_cache = SuggestCache.from_file('data/p0dg76f.jsonld')
+    p_recon = PeriodoReconciler(
+        host='localhost:{}'.format(server.server_port),
+        instrumentation=instrumentation, suggest_cache=suggest_cache)
+
+    # typing 'late roman', then again in another case
+    for prefix in ['l', 'la', 'lat', 'late', 'late ', 'late r', 'late ro',
+                   'L', 'Late Roman', 'r', 'ro', 'rom']:
+        assert (p_recon.suggest_entities(prefix) ==
+                l_recon.suggest_entities(prefix))
+
+    assert instrumentation.counters['requests_sent'] == 2
+    assert suggest_cache.stats['misses'] == 2
+    assert suggest_cache.stats['narrowed'] == 8
+    assert suggest_cache.stats['hits'] == 2
+
+
+def test_suggest_cache_lru(l_recon):
+    suggest_cache = SuggestCache(max_entries=2)
+    for prefix in ['a', 'b', 'c']:
+        assert suggest_cache.get(prefix) is None
+        suggest_cache.set(prefix, l_recon.suggest_entities(prefix))
+    assert len(suggest_cache) == 2
+    assert suggest_cache.stats['evictions'] == 1
+    assert suggest_cache.get('a') is None
+    # changing the results returned doesn't change the cache
+    suggest_cache.get('b').clear()
+    assert suggest_cache.get('b') == l_recon.suggest_entities('b')
+    # without periods, longer prefixes are not narrowed
+    assert suggest_cache.get('bronze') is None
+
+    # results as long as the limit may be cut short
+    suggest_cache = SuggestCache(periods=l_recon.periods, limit=2)
+    suggest_cache.set('b', l_recon.suggest_entities('b')[:2])
+    assert suggest_cache.get('br') is None
+    suggest_cache.set('r', l_recon.suggest_entities('r')[:1])
+    assert suggest_cache.get('ro') is not None
+
+    # results that don't match their prefix can't be narrowed, and are
+    # fetched again
+    suggest_cache = SuggestCache.from_file('data/p0dg76f.jsonld')
+    suggest_cache.set('rom', l_recon.suggest_entities('late'))
+    assert suggest_cache.get('roma') is None